@@ -1,11 +1,16 @@
 """
 The base dectest package. Provides a shortcut to several usefull classes. The
 :class:`~.suite.TestSuite` class is imported, as it is vital to any use of
-dectest. Two different config methods are imported: :class:`~.config.DictConfig`
-and :class:`~.config.PythonFileConfig`, along with two side affect tests from
-the :mod:`~.sideaffects` module: :class:`~.sideaffects.GlobalStateChange` and
+dectest. The config methods :class:`~.config.DictConfig`,
+:class:`~.config.PythonFileConfig`, :class:`~.config.IniFileConfig`,
+:class:`~.config.JsonFileConfig`, :class:`~.config.TomlFileConfig`,
+:class:`~.config.EnvConfig` and :class:`~.config.LayeredConfig` are
+imported, along with two side affect tests from the :mod:`~.sideaffects`
+module: :class:`~.sideaffects.GlobalStateChange` and
 :class:`~.sideaffects.ClassStateChange`.
 """
-from .config import DictConfig, PythonFileConfig
+from .config import (DictConfig, PythonFileConfig, IniFileConfig,
+                     JsonFileConfig, TomlFileConfig, EnvConfig,
+                     LayeredConfig)
 from .suite import TestSuite
 from .sideaffects import GlobalStateChange, ClassStateChange
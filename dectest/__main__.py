@@ -0,0 +1,8 @@
+"""
+Allows the command line runner to be run with ``python -m dectest``.
+"""
+import sys
+
+from .runner import main
+
+sys.exit(main())
@@ -0,0 +1,343 @@
+"""
+Benchmarks of dectest itself. Run them with::
+
+    $ python -m dectest.benchmarks
+    $ python -m dectest.benchmarks wrapper_tested register --json
+
+The benchmarks cover the paths that dectest adds to a program, or that run
+once per test case:
+
+* ``memory`` - the bytes used by each registered test case, measured from the
+  growth of the process' resident set size while a large number of test cases
+  are registered.
+* ``wrapper_untested`` and ``wrapper_tested`` - the time the wrapper around a
+  tested function adds to each call, before the function has been tested
+  (with ``testing.testasrun`` off) and after.
+* ``register`` - the time taken to register a test case.
+* ``sideaffect_getattr`` - the time taken to create a side affect test by
+  accessing it on a test case.
+* ``config_get``, ``config_get_bool`` and ``config_get_python`` - the time
+  taken to look up a config value.
+* ``globalstatechange`` and ``classstatechange`` - the time taken to snapshot
+  and check ten variables.
+* ``test_1k``, ``test_10k`` and ``test_100k`` - the number of test cases run
+  per second by :meth:`~dectest.suite.TestSuite.test`.
+
+Results saved with ``--json`` can be compared against with ``--baseline``, in
+which case the exit status is 1 if any benchmark is worse than the baseline by
+more than the ``--tolerance``.
+"""
+
+import argparse
+import functools
+import gc
+import json
+import os
+import resource
+import StringIO
+import sys
+
+from . import perf
+from .config import DictConfig
+from .sideaffects import ClassStateChange, GlobalStateChange
+from .suite import TestSuite
+
+def rss():
+    """
+    Returns the resident set size of the process in bytes. On platforms
+    without ``/proc``, the peak resident set size is used instead.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (IOError, OSError):
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on OS X, and kilobytes elsewhere
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+def make_suite(count, name="benchmark"):
+    """
+    Returns a test suite with ``count`` registered test cases, each with a
+    small input, output and a tag. The test cases are spread over 100
+    functions, and the inputs repeat, as they tend to in real suites.
+    """
+    ts = TestSuite(name, DictConfig({'testing': {'testasrun': False}}))
+    functions = []
+    for i in range(100):
+        def func(value):
+            return value + 1
+        functions.append(func)
+
+    for i in range(count):
+        case_name = "case{0}".format(i)
+        decorator = ts.register(case_name, tags=["fast"])
+        tc = getattr(ts, case_name)
+        tc.input(i % 50)
+        tc.out(i % 50 + 1)
+        decorator(functions[i % 100])
+    return ts
+
+def bench_memory(count=100000):
+    """
+    Registers ``count`` test cases and returns the number of bytes of memory
+    used per test case.
+    """
+    gc.collect()
+    before = rss()
+    ts = make_suite(count, "memory")
+    gc.collect()
+    after = rss()
+    ts.unregister()
+    del ts
+    gc.collect()
+    return float(after - before) / count
+
+def per_call(func, repeat=5, min_time=0.05):
+    """
+    Returns the number of seconds taken by a call to ``func``, as the best of
+    ``repeat`` timed batches of calls.
+    """
+    number = perf.calibrate(func, min_time)
+    return min(perf.time_batch(func, number)
+               for i in range(repeat)) / number
+
+def quietly(func):
+    """
+    Calls ``func`` with anything it prints discarded, and returns the result.
+    """
+    stdout = sys.stdout
+    sys.stdout = StringIO.StringIO()
+    try:
+        return func()
+    finally:
+        sys.stdout = stdout
+
+def wrapper_overhead(tested):
+    """
+    Returns the number of seconds the wrapper around a tested function adds to
+    each call. If ``tested`` is false, the function is never tested, as
+    ``testing.testasrun`` is off.
+    """
+    ts = TestSuite("wrapper", DictConfig({'testing': {'testasrun': tested}}))
+    
+    def func(value):
+        return value
+    
+    wrapped = ts.register("tc")(ts.tc.input(1)(ts.tc.out(1)(func)))
+    try:
+        quietly(lambda: wrapped(1))
+        raw = per_call(lambda: func(1))
+        return max(per_call(lambda: wrapped(1)) - raw, 0.0)
+    finally:
+        ts.unregister()
+
+def bench_wrapper_untested():
+    """
+    Returns the overhead of the wrapper before testing, in nanoseconds.
+    """
+    return wrapper_overhead(False) * 1e9
+
+def bench_wrapper_tested():
+    """
+    Returns the overhead of the wrapper after testing, in nanoseconds.
+    """
+    return wrapper_overhead(True) * 1e9
+
+def bench_register(count=10000):
+    """
+    Returns the time taken to register each of ``count`` test cases, in
+    microseconds.
+    """
+    gc.collect()
+    start = perf.clock()
+    ts = make_suite(count, "register")
+    elapsed = perf.clock() - start
+    ts.unregister()
+    return elapsed / count * 1e6
+
+def bench_sideaffect_getattr(count=10000):
+    """
+    Returns the time taken to create a side affect test on each of ``count``
+    test cases, in microseconds.
+    """
+    ts = TestSuite("getattr", DictConfig({'testing': {
+                    'testasrun': False,
+                    'sideaffects': ['dectest.sideaffects.GlobalStateChange']}}))
+    cases = []
+    for i in range(count):
+        name = "case{0}".format(i)
+        ts.register(name)
+        cases.append(getattr(ts, name))
+    
+    start = perf.clock()
+    for tc in cases:
+        tc.globalstatechange
+    elapsed = perf.clock() - start
+    ts.unregister()
+    return elapsed / count * 1e6
+
+BENCH_CONFIG = DictConfig({
+        'testing': {'testasrun': 'yes', 'timeout': 2.5},
+        'profiling': {'limit': 10},
+        })
+
+def bench_config_get():
+    """
+    Returns the time taken by ``get``, in nanoseconds.
+    """
+    return per_call(lambda: BENCH_CONFIG.get('profiling', 'limit')) * 1e9
+
+def bench_config_get_bool():
+    """
+    Returns the time taken by ``get_bool``, in nanoseconds.
+    """
+    return per_call(lambda: BENCH_CONFIG.get_bool('testing', 'testasrun')) * 1e9
+
+def bench_config_get_python():
+    """
+    Returns the time taken by ``get_python``, in nanoseconds.
+    """
+    return per_call(lambda: BENCH_CONFIG.get_python(
+            'dectest.sideaffects.GlobalStateChange')) * 1e9
+
+class _State():
+    pass
+
+def bench_globalstatechange(variables=10):
+    """
+    Returns the time taken by :class:`~dectest.sideaffects.GlobalStateChange`
+    to snapshot and check ``variables`` global variables, in microseconds.
+    """
+    namespace = dict(("var{0}".format(i), i) for i in range(variables))
+    exec "def func():\n    pass" in namespace
+    
+    sat = GlobalStateChange(None)
+    sat.decorator(dict((name, lambda a, b: a == b) for name in namespace
+                       if name.startswith("var")))(namespace["func"])
+    
+    def snapshot():
+        sat.pre_test()
+        sat.test()
+    return per_call(snapshot) * 1e6
+
+def bench_classstatechange(variables=10):
+    """
+    Returns the time taken by :class:`~dectest.sideaffects.ClassStateChange`
+    to snapshot and check ``variables`` attributes, in microseconds.
+    """
+    instance = _State()
+    for i in range(variables):
+        setattr(instance, "var{0}".format(i), i)
+    
+    sat = ClassStateChange(None)
+    sat.decorator(dict((name, lambda a, b: a == b) for name in
+                       vars(instance)))
+    sat.instance = instance
+    
+    def snapshot():
+        sat.pre_test()
+        sat.test()
+    return per_call(snapshot) * 1e6
+
+def bench_test(count):
+    """
+    Returns the number of test cases run per second by
+    :meth:`~dectest.suite.TestSuite.test`, for a suite of ``count`` test cases.
+    The suite's report is discarded.
+    """
+    ts = make_suite(count, "test{0}".format(count))
+    gc.collect()
+    start = perf.clock()
+    quietly(ts.test)
+    elapsed = perf.clock() - start
+    ts.unregister()
+    return count / elapsed
+
+# Each benchmark's function, unit, and whether "lower" or "higher" is better
+BENCHMARKS = {
+    "memory": (bench_memory, "bytes per registered test case", "lower"),
+    "wrapper_untested": (bench_wrapper_untested, "ns per call", "lower"),
+    "wrapper_tested": (bench_wrapper_tested, "ns per call", "lower"),
+    "register": (bench_register, "us per test case", "lower"),
+    "sideaffect_getattr": (bench_sideaffect_getattr, "us per side affect test",
+                           "lower"),
+    "config_get": (bench_config_get, "ns per call", "lower"),
+    "config_get_bool": (bench_config_get_bool, "ns per call", "lower"),
+    "config_get_python": (bench_config_get_python, "ns per call", "lower"),
+    "globalstatechange": (bench_globalstatechange, "us per test", "lower"),
+    "classstatechange": (bench_classstatechange, "us per test", "lower"),
+    "test_1k": (functools.partial(bench_test, 1000), "test cases per second",
+                "higher"),
+    "test_10k": (functools.partial(bench_test, 10000), "test cases per second",
+                 "higher"),
+    "test_100k": (functools.partial(bench_test, 100000),
+                  "test cases per second", "higher"),
+    }
+
+def regressions(results, baseline, tolerance):
+    """
+    Returns a list of ``(name, value, baseline_value)`` tuples, for each
+    benchmark in ``results`` that is worse than it's value in ``baseline`` by
+    more than the fraction ``tolerance``.
+    """
+    worse = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        value = result["value"]
+        old = baseline[name]["value"]
+        if BENCHMARKS[name][2] == "lower":
+            regressed = value > old * (1 + tolerance)
+        else:
+            regressed = value < old * (1 - tolerance)
+        if regressed:
+            worse.append((name, value, old))
+    return worse
+
+def main(argv=None):
+    """
+    Runs the benchmarks named on the command line, or all of them, and prints
+    the results. Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(prog="python -m dectest.benchmarks",
+                                     description="Benchmark dectest itself.")
+    parser.add_argument("names", nargs="*", default=sorted(BENCHMARKS),
+                        help="the benchmarks to run")
+    parser.add_argument("--json", action="store_true",
+                        help="print the results as JSON")
+    parser.add_argument("--baseline", default=None, metavar="FILE",
+                        help="compare the results to those saved in this "
+                        "JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="the fraction by which a benchmark may be worse "
+                        "than the baseline")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.names:
+        if name not in BENCHMARKS:
+            sys.stderr.write("Unknown benchmark {0}\n".format(name))
+            return 2
+        func, unit, better = BENCHMARKS[name]
+        results[name] = {"value": func(), "unit": unit, "better": better}
+
+    if args.json:
+        print json.dumps(results, sort_keys=True)
+    else:
+        for name, result in sorted(results.items()):
+            print "{0:<20} {1:>14.1f} {2}".format(name, result["value"],
+                                                  result["unit"])
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        worse = regressions(results, baseline, args.tolerance)
+        for name, value, old in worse:
+            sys.stderr.write("{0} regressed from {1:.1f} to {2:.1f} {3}\n"
+                             .format(name, old, value, results[name]["unit"]))
+        if worse:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
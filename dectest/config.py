@@ -1,11 +1,26 @@
 """
-The configurations system for dectest. Offers two different methods of
-configuration; as a python file or from a dict. Each method is implemented in a
-different class, but they all provide the same interface.
+The configurations system for dectest. Offers several different methods of
+configuration; as a python file, an INI, JSON or TOML file, environment
+variables, or from a dict. Each method is implemented in a different class, but
+they all provide the same interface, and can be layered on top of each other
+with :class:`LayeredConfig`.
 """
 
-import imp
+import collections
+import ConfigParser
+import hashlib
+import inspect
+import json
+import os
 import re
+import StringIO
+import threading
+import time
+
+try:
+    import toml
+except ImportError:
+    toml = None
 
 DEFAULTS = {
     'testing': {
@@ -14,9 +29,118 @@ DEFAULTS = {
         'runtests': True,
         'pretest': None,
         'posttest': None,
-        }
+        'timeout': None,
+        'maxfail': None,
+        },
+    'profiling': {
+        'interval': 0.001,
+        'limit': 20,
+        'statsdir': None,
+        'collapsed': None,
+        },
+    'metrics': {
+        'enabled': False,
+        'overhead': False,
+        },
+    'distributed': {
+        'workers': None,
+        'batchsize': 4,
+        'timeout': 10.0,
+        'attempts': 2,
+        },
+    'history': {
+        'file': None,
+        'window': 10,
+        'repeats': 5,
+        'batchtime': 0.001,
+        'alpha': 0.01,
+        'threshold': 0.2,
+        },
     }
 
+# The types of the items whose default is None. The types of the other items are
+# taken from their defaults.
+TYPES = {
+    'testing': {
+        'pretest': str,
+        'posttest': str,
+        'timeout': float,
+        'maxfail': int,
+        },
+    'profiling': {
+        'statsdir': str,
+        'collapsed': str,
+        },
+    'distributed': {
+        'workers': list,
+        },
+    'history': {
+        'file': str,
+        },
+    }
+
+BOOL_MAPPING = {
+    'yes': True,
+    'true': True,
+    'y': True,
+    'no': False,
+    'false': False,
+    'n': False,
+    }
+
+def item_type(section_name, item_name):
+    """
+    Returns the type of the given config item, or ``None`` if it's type is not
+    known.
+    """
+    item_types = TYPES.get(section_name, {})
+    if item_name in item_types:
+        return item_types[item_name]
+    default = DEFAULTS.get(section_name, {}).get(item_name)
+    if default is None:
+        return None
+    return type(default)
+
+def convert(value, to_type):
+    """
+    Converts ``value`` to ``to_type``, following the same rules as the
+    ``get_foo`` methods of :class:`ConfigInterface`. Raises ``ValueError`` if
+    the value can't be converted.
+    """
+    if value is None or to_type is None or isinstance(value, to_type):
+        return value
+    if to_type is bool:
+        if isinstance(value, basestring) and value.lower() in BOOL_MAPPING:
+            return BOOL_MAPPING[value.lower()]
+        raise ValueError("{0!r} is not a boolean".format(value))
+    if to_type is list:
+        if isinstance(value, basestring):
+            return [v.strip() for v in value.split(",") if v.strip()]
+        return list(value)
+    if to_type is str:
+        # Python names may be given as objects, so leave those alone
+        return value
+    return to_type(value)
+
+def validate(store, logger):
+    """
+    Returns a copy of ``store`` with every item whose type is known converted
+    to that type. Items that can't be converted are dropped with a warning, so
+    that their defaults are used instead.
+    """
+    validated = {}
+    for section_name, section in store.items():
+        validated[section_name] = {}
+        for item_name, value in section.items():
+            try:
+                value = convert(value, item_type(section_name, item_name))
+            except (TypeError, ValueError) as e:
+                logger.warning("Invalid value for config value {0}.{1}: {2}"
+                               .format(section_name, item_name, e))
+                continue
+            validated[section_name][item_name] = value
+    return validated
+
 class DummyLogger():
     """
     A dummy logger to allow quite degregation.
@@ -117,19 +241,11 @@ class ConfigInterface():
         boolean, then `None` will be returned.
         """
         value = self.get(section_name, item_name)
-        if isinstance(value, (str, unicode)):
-            bool_mapping = {
-                'yes': True,
-                'true': True,
-                'y': True,
-                'no': False,
-                'false': False,
-                'n': False,
-                }
-            if value.lower() in bool_mapping:
-                return bool_mapping[value.lower()]
-        elif isinstance(value, bool):
+        if isinstance(value, bool):
             return value
+        elif isinstance(value, (str, unicode)):
+            if value.lower() in BOOL_MAPPING:
+                return BOOL_MAPPING[value.lower()]
         else:
             return None
     
@@ -151,7 +267,9 @@ class ConfigInterface():
         converted, then `None` will be returned.
         """
         value = self.get(section_name, item_name)
-        if isinstance(value, (str, unicode)):
+        if isinstance(value, list):
+            return value or None
+        elif isinstance(value, (str, unicode)):
             return value.split(",") or None
         else:
             try:
@@ -250,7 +368,110 @@ class DefaultConfig(ConfigInterface):
     
     store = DEFAULTS
 
-class PythonFileConfig(ConfigInterface):
+class FileConfig(ConfigInterface):
+    """
+    A base class for config classes that load their values from a file.
+    Subclasses implement :meth:`_parse`, which returns a new store built from
+    the file.
+    
+    The file is only parsed again when it's modification time or size changes.
+    If ``check_interval`` is given, then the file is checked at most that many
+    seconds apart as the config is read, so that long running processes pick
+    up changes without restarting. Otherwise :meth:`refresh` must be called to
+    check the file.
+    
+    A new store is always built in full before it replaces the old one, so
+    readers see either the old config or the new config, never a mix. If the
+    file can't be parsed, the old config is kept.
+    """
+    
+    def __init__(self, filename, check_interval=None):
+        """
+        Set the filename, and load it.
+        """
+        self.filename = filename
+        self.check_interval = check_interval
+        # Until the file is loaded successfully, the store is empty, so that
+        # the defaults are used, and the file hides nothing in a LayeredConfig
+        self._store = {}
+        self._stamp = None
+        self._checked = time.time()
+        self._lock = threading.Lock()
+        self.reload()
+    
+    @property
+    def store(self):
+        """
+        The values loaded from the file. If ``check_interval`` seconds have
+        passed since the file was last checked, it is checked for changes
+        first.
+        """
+        if self.check_interval is not None and \
+                time.time() - self._checked >= self.check_interval:
+            self.refresh()
+        return self._store
+    
+    def refresh(self):
+        """
+        Reloads the file if it has changed since it was last loaded. Returns
+        ``True`` if the file was reloaded.
+        
+        If another thread is already reloading the file, then this returns
+        straight away, and the current config continues to be used.
+        """
+        self._checked = time.time()
+        try:
+            if self._stat() == self._stamp:
+                return False
+        except OSError:
+            return False
+        
+        if not self._lock.acquire(False):
+            return False
+        try:
+            self.reload()
+        finally:
+            self._lock.release()
+        return True
+    
+    def reload(self):
+        """
+        Reloads the configuration file, and replaces the store with the new
+        values.
+        """
+        try:
+            stamp = self._stat()
+            store = self._parse()
+        except Exception as e:
+            self._logger.warning("Could not load configuration file " +
+                                 self.filename + ", raised exception " +
+                                 str(e))
+            # Don't try again untill the file changes
+            try:
+                self._stamp = self._stat()
+            except OSError:
+                pass
+            return
+        
+        self._stamp = stamp
+        self._store = store
+    
+    def _stat(self):
+        """
+        Returns the modification time and size of the file, which are used to
+        tell if it has changed.
+        """
+        st = os.stat(self.filename)
+        return st.st_mtime, st.st_size
+    
+    def _parse(self):
+        """
+        Parses the file and returns a new store. Must be implemented by
+        subclasses.
+        """
+        raise NotImplementedError()
+
+class PythonFileConfig(FileConfig):
     """
     A config class that loads the dictionary from the global namespace of any 
     given python file.
@@ -267,39 +488,215 @@ class PythonFileConfig(ConfigInterface):
     
         class section2:
             foo = "bar"
+    
+    The file is executed in a namespace of it's own, rather than being imported
+    as a module, so reloading it does not touch ``sys.modules``. See
+    :class:`FileConfig` for how changes to the file are picked up.
     """
     
-    def __init__(self, filename):
+    def _parse(self):
         """
-        Set the filename, and load it.
+        Executes the configuration file, and builds a store from the classes it
+        defines.
         """
-        self.filename = filename
-        # We set this as if the reload method fails, store may be unbound
+        with open(self.filename) as f:
+            code = compile(f.read(), self.filename, "exec")
+        namespace = {"__name__": "dectest_config", "__file__": self.filename}
+        exec code in namespace
+        
+        store = {}
+        for s_name, s_value in namespace.items():
+            if s_name.startswith("_") or not inspect.isclass(s_value):
+                continue
+            
+            store[s_name] = dict((i_name, i_value) for i_name, i_value in
+                                 s_value.__dict__.items()
+                                 if not i_name.startswith("_"))
+        return store
+
+class DeclarativeFileConfig(FileConfig):
+    """
+    A base class for config classes that load their values from a declarative
+    file format. Subclasses implement :meth:`_parse_text`, which returns a
+    store built from the contents of the file.
+    
+    The values are converted to the types of their defaults once, as the file
+    is loaded, rather than every time they are read. Parsed files are cached
+    by the hash of their contents, so loading the same file again, from
+    another config object or after it is touched, does not parse it again.
+    Only the ``cache_size`` most recently used files are kept.
+    """
+    
+    cache_size = 32
+    _cache = collections.OrderedDict()
+    _cache_lock = threading.Lock()
+    
+    def _parse(self):
+        """
+        Returns the validated store for the file, from the cache if possible.
+        """
+        with open(self.filename, "rb") as f:
+            text = f.read()
+        key = (type(self).__name__, hashlib.sha1(text).hexdigest())
+        with self._cache_lock:
+            store = self._cache.pop(key, None)
+            if store is not None:
+                self._cache[key] = store
+                return store
+        
+        store = validate(self._parse_text(text), self._logger)
+        with self._cache_lock:
+            self._cache[key] = store
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return store
+    
+    def _parse_text(self, text):
+        """
+        Parses the contents of the file and returns a store. Must be
+        implemented by subclasses.
+        """
+        raise NotImplementedError()
+
+class IniFileConfig(DeclarativeFileConfig):
+    """
+    A config class that loads an INI file. Each section of the file is a
+    config section. For example::
+    
+        [testing]
+        testasrun = no
+        sideaffects = dectest.sideaffects.GlobalStateChange,
+                      dectest.sideaffects.Profile
+    """
+    
+    def _parse_text(self, text):
+        """
+        Parses the INI file.
+        """
+        parser = ConfigParser.RawConfigParser()
+        parser.optionxform = str
+        parser.readfp(StringIO.StringIO(text), self.filename)
+        return dict((section, dict(parser.items(section)))
+                    for section in parser.sections())
+
+class JsonFileConfig(DeclarativeFileConfig):
+    """
+    A config class that loads a JSON file. The file should contain an object
+    mapping section names to objects of items. For example::
+    
+        {"testing": {"testasrun": false, "timeout": 2.5}}
+    """
+    
+    def _parse_text(self, text):
+        """
+        Parses the JSON file.
+        """
+        store = json.loads(text)
+        if not isinstance(store, dict):
+            raise ValueError("JSON config must be an object")
+        return store
+
+class TomlFileConfig(DeclarativeFileConfig):
+    """
+    A config class that loads a TOML file. Each table of the file is a config
+    section. This requires the ``toml`` package. For example::
+    
+        [testing]
+        testasrun = false
+        sideaffects = ["dectest.sideaffects.GlobalStateChange"]
+    """
+    
+    def _parse_text(self, text):
+        """
+        Parses the TOML file.
+        """
+        if toml is None:
+            raise ImportError("The toml package is needed to load " +
+                              self.filename)
+        return toml.loads(text.decode("utf-8"))
+
+class EnvConfig(ConfigInterface):
+    """
+    A config class that loads values from environment variables named
+    ``DECTEST_<SECTION>_<ITEM>``. For example, ``DECTEST_TESTING_TESTASRUN=no``
+    sets the ``testasrun`` item of the ``testing`` section. Section names may
+    not contain underscores, but item names may.
+    
+    The environment is read when the object is created, and when
+    :meth:`reload` is called.
+    """
+    
+    prefix = "DECTEST_"
+    
+    def __init__(self, environ=None):
+        """
+        Load the values from ``environ``, which defaults to ``os.environ``.
+        """
+        self.environ = os.environ if environ is None else environ
         self.store = {}
         self.reload()
     
     def reload(self):
         """
-        Reloads the configuration file, and populates the store attribute.
+        Reloads the values from the environment.
         """
-        try:
-            module = imp.load_source('config', self.filename)
-        except Exception as e:
-            self.store = DEFAULTS
-            self._logger.warning("Could not load configuration file " +
-                                 self.filename + ", raised exception " +
-                                 str(e))
-            return
-        
-        self.store = {}
-        
-        for s_name, s_value in module.__dict__.items():
-            if s_name.startswith("_") or not type(s_value) == type:
+        store = {}
+        for name, value in self.environ.items():
+            if not name.startswith(self.prefix):
                 continue
-            
-            self.store[s_name] = {}
-            for i_name, i_value in s_value.__dict__.items():
-                self.store[s_name][i_name] = i_value
+            parts = name[len(self.prefix):].lower().split("_", 1)
+            if len(parts) != 2:
+                continue
+            store.setdefault(parts[0], {})[parts[1]] = value
+        self.store = validate(store, self._logger)
+
+class LayeredConfig(ConfigInterface):
+    """
+    Combines several config objects. Each value is taken from the first config
+    that has it, so configs should be given from highest to lowest precedence.
+    For example, to let environment variables override a file::
+    
+        config = LayeredConfig(EnvConfig(), IniFileConfig("dectest.ini"))
+    
+    The combined store is only rebuilt when the store of one of the configs is
+    replaced, for instance when a :class:`FileConfig` reloads.
+    """
+    
+    def __init__(self, *configs):
+        self.configs = configs
+        self._sources = None
+        self._store = {}
+    
+    @property
+    def store(self):
+        """
+        The combined values of all the configs.
+        """
+        stores = [config.store for config in self.configs]
+        if self._sources is None or \
+                any(a is not b for a, b in zip(stores, self._sources)):
+            merged = {}
+            for store in reversed(stores):
+                for section_name, section in store.items():
+                    merged.setdefault(section_name, {}).update(section)
+            self._store = merged
+            self._sources = stores
+        return self._store
+    
+    def reload(self):
+        """
+        Reloads every config.
+        """
+        for config in self.configs:
+            config.reload()
+    
+    def set_logger(self, logger):
+        """
+        Sets the logger of this config and every config it combines.
+        """
+        self._logger = logger
+        for config in self.configs:
+            config.set_logger(logger)
 
 class DictConfig(ConfigInterface):
     """
@@ -0,0 +1,180 @@
+"""
+Line coverage of tested modules, collected per test case. Only the files given
+to a :class:`CoverageCollector` are traced, so code outside the tested modules
+runs at close to full speed: coverage is collected with ``sys.settrace``, and
+the global trace function declines to trace frames from any other file.
+
+The lines executed in each file are stored as a :class:`Bitmap`, with one bit
+per line.
+"""
+
+import array
+import dis
+import sys
+
+class Bitmap():
+    """
+    A set of line numbers, stored as an array of bytes with one bit per line.
+    """
+
+    def __init__(self):
+        self.bits = array.array("B")
+
+    def add(self, line):
+        """
+        Adds ``line`` to the set.
+        """
+        index = line >> 3
+        bits = self.bits
+        if index >= len(bits):
+            bits.extend([0] * (index + 1 - len(bits)))
+        bits[index] |= 1 << (line & 7)
+
+    def __contains__(self, line):
+        index = line >> 3
+        return index < len(self.bits) and bool(self.bits[index] &
+                                               (1 << (line & 7)))
+
+    def __iter__(self):
+        for index, byte in enumerate(self.bits):
+            if byte:
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        yield (index << 3) + bit
+
+    def __len__(self):
+        return sum(bin(byte).count("1") for byte in self.bits)
+
+    def update(self, other):
+        """
+        Adds every line in ``other`` to the set.
+        """
+        bits = self.bits
+        if len(other.bits) > len(bits):
+            bits.extend([0] * (len(other.bits) - len(bits)))
+        for index, byte in enumerate(other.bits):
+            if byte:
+                bits[index] |= byte
+
+def executable_lines(filename):
+    """
+    Returns the set of line numbers in the python file ``filename`` that have
+    code on them.
+    """
+    try:
+        with open(filename) as f:
+            code = compile(f.read(), filename, "exec")
+    except (IOError, SyntaxError):
+        return set()
+
+    lines = set()
+    codes = [code]
+    while codes:
+        code = codes.pop()
+        lines.update(line for offset, line in dis.findlinestarts(code))
+        codes.extend(const for const in code.co_consts
+                     if hasattr(const, "co_code"))
+    return lines
+
+class CoverageCollector():
+    """
+    Collects the lines executed in the files ``filenames`` between calls to
+    :meth:`start` and :meth:`stop`, in the thread that called :meth:`start`.
+    The lines are stored in the ``bitmaps`` attribute, a dict mapping each
+    file name to a :class:`Bitmap`.
+    """
+
+    def __init__(self, filenames):
+        self.filenames = frozenset(filenames)
+        self.bitmaps = {}
+        self._old_trace = None
+
+    def start(self):
+        """
+        Start collecting coverage.
+        """
+        self.bitmaps = dict((filename, Bitmap())
+                            for filename in self.filenames)
+        self._old_trace = sys.gettrace()
+        sys.settrace(self._global_trace)
+
+    def stop(self):
+        """
+        Stop collecting coverage.
+        """
+        sys.settrace(self._old_trace)
+        self._old_trace = None
+
+    def _global_trace(self, frame, event, arg):
+        """
+        The global trace function. Only frames from the traced files get a
+        local trace function.
+        """
+        bitmap = self.bitmaps.get(frame.f_code.co_filename)
+        if bitmap is None:
+            return None
+
+        add = bitmap.add
+
+        def local_trace(frame, event, arg):
+            if event == "line":
+                add(frame.f_lineno)
+            return local_trace
+
+        return local_trace
+
+class CoverageReport():
+    """
+    The coverage of each test case, as collected by
+    :class:`CoverageCollector`.
+    """
+
+    def __init__(self):
+        self.cases = {}
+
+    def add(self, name, bitmaps):
+        """
+        Adds the coverage of the test case ``name``.
+        """
+        self.cases[name] = bitmaps
+
+    def merged(self):
+        """
+        Returns a dict mapping each file name to a :class:`Bitmap` of the lines
+        executed by any test case.
+        """
+        merged = {}
+        for bitmaps in self.cases.values():
+            for filename, bitmap in bitmaps.items():
+                merged.setdefault(filename, Bitmap()).update(bitmap)
+        return merged
+
+    def print_summary(self, stream=None):
+        """
+        Prints the number of executable lines in each file, how many were
+        executed, and the lines that were not.
+        """
+        stream = stream or sys.stdout
+        stream.write("{0:<50} {1:>6} {2:>6} {3:>6}  {4}\n".format(
+                "File", "Lines", "Run", "Cover", "Missing"))
+        for filename, bitmap in sorted(self.merged().items()):
+            lines = executable_lines(filename)
+            run = len(lines.intersection(bitmap))
+            missing = sorted(line for line in lines if line not in bitmap)
+            stream.write("{0:<50} {1:>6} {2:>6} {3:>5.0f}%  {4}\n".format(
+                    filename[-50:], len(lines), run,
+                    100.0 * run / len(lines) if lines else 100.0,
+                    _format_ranges(missing)))
+
+def _format_ranges(lines):
+    """
+    Formats a sorted list of line numbers as ranges, such as ``3-5, 9``.
+    """
+    ranges = []
+    for line in lines:
+        if ranges and ranges[-1][1] == line - 1:
+            ranges[-1][1] = line
+        else:
+            ranges.append([line, line])
+    return ", ".join(str(a) if a == b else "{0}-{1}".format(a, b)
+                     for a, b in ranges)
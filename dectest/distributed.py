@@ -0,0 +1,423 @@
+"""
+Running test cases on worker daemons, so that test suites can be spread over
+more processes, or machines, than one. Start a worker with::
+
+    $ python -m dectest worker localhost:7357 tests/
+
+A worker imports the test suites at the given paths when it starts, and keeps
+them imported, so the cost of importing is paid once rather than on every
+run. It then runs the batches of test cases it is sent over TCP, or over a
+Unix socket if the address is given as ``unix:<path>``.
+
+A :class:`Coordinator` hands the test cases out to the workers. The test
+cases are dealt out evenly to begin with, and a worker that finishes it's own
+share steals half of the share of the busiest other worker. Workers send a
+heartbeat while they run a batch, and a worker that stops sending anything,
+or whose connection is lost, is taken to be dead; the test cases it had are
+given to the remaining workers.
+
+Test cases are identified by the file the suite is found in, the name of the
+suite and the name of the test case, so the workers must be able to read the
+same files as the coordinator. A worker only runs test cases from the suites it
+found at the given paths when it started, and refuses any other file it is
+sent. Even so, anyone who can connect to a worker can run those test cases, so
+workers should only listen on addresses that untrusted users can't reach.
+"""
+
+import argparse
+import collections
+import json
+import logging
+import os
+import socket
+import SocketServer
+import sys
+import threading
+
+from . import runner
+
+DEFAULT_PORT = 7357
+
+def parse_address(address):
+    """
+    Returns a tuple of the socket family and the socket address for
+    ``address``, which is either ``host:port``, ``host`` or ``unix:<path>``.
+    """
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, sep, port = address.rpartition(":")
+    if not sep:
+        return socket.AF_INET, (address, DEFAULT_PORT)
+    return socket.AF_INET, (host, int(port))
+
+def case_key(suite, tc):
+    """
+    Returns the ``(filename, suite_name, case_name)`` tuple that identifies the
+    test case ``tc`` of ``suite`` to a worker. The file is the source file of
+    the module the tested function was defined in.
+    """
+    module = sys.modules[tc.get_function().__module__]
+    filename = os.path.realpath(module.__file__)
+    if filename.endswith((".pyc", ".pyo")):
+        filename = filename[:-1]
+    return filename, suite.name, tc.name
+
+def send(wfile, message):
+    """
+    Writes ``message`` to ``wfile`` as a line of JSON.
+    """
+    wfile.write(json.dumps(message) + "\n")
+    wfile.flush()
+
+def receive(rfile):
+    """
+    Reads a line of JSON from ``rfile``. Returns ``None`` at the end of the
+    file.
+    """
+    line = rfile.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+class WorkerHandler(SocketServer.StreamRequestHandler):
+    """
+    Handles a connection from a coordinator. Batches are run in the thread
+    that serves the connection, so that test case timeouts work, while a
+    second thread sends heartbeats.
+    """
+
+    def handle(self):
+        self.lock = threading.Lock()
+        while True:
+            try:
+                message = receive(self.rfile)
+            except (ValueError, socket.error):
+                return
+            if message is None:
+                return
+
+            if message["op"] == "ping":
+                self.send({"op": "pong"})
+            elif message["op"] == "run":
+                self.run_batch(message["cases"])
+
+    def send(self, message):
+        with self.lock:
+            send(self.wfile, message)
+
+    def run_batch(self, cases):
+        """
+        Runs the batch of test cases and sends the results.
+        """
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self.beat, args=(done,))
+        heartbeat.daemon = True
+        heartbeat.start()
+        try:
+            results = [list(case) + [self.server.run_case(*case)]
+                       for case in cases]
+        finally:
+            done.set()
+            heartbeat.join()
+        self.send({"op": "results", "results": results})
+
+    def beat(self, done):
+        """
+        Sends a heartbeat every ``heartbeat`` seconds untill ``done`` is set.
+        """
+        while not done.wait(self.server.heartbeat):
+            try:
+                self.send({"op": "heartbeat"})
+            except socket.error:
+                return
+
+class _TCPServer(SocketServer.TCPServer):
+    allow_reuse_address = True
+
+class Worker():
+    """
+    A worker daemon, listening on ``address`` for coordinators. The test suites
+    at ``paths`` are imported when the worker is created, and are the only
+    test suites it will run test cases from.
+    """
+
+    def __init__(self, address, paths=(), heartbeat=1.0, logger=None):
+        self.address = address
+        self.heartbeat = heartbeat
+        self._logger = logger or logging.getLogger("dectest.worker")
+        self._suites = {}
+
+        for filename, entry in runner.collect(paths):
+            for suite_entry in entry["suites"]:
+                suite = runner.load_suite(filename, suite_entry["name"])
+                if suite is not None:
+                    self._suites[(os.path.realpath(filename), suite.name)] = \
+                        suite
+                    self._logger.info("Loaded test suite {0} from {1}".format(
+                            suite.name, filename))
+
+        family, sockaddr = parse_address(address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(sockaddr):
+                os.unlink(sockaddr)
+            server_class = SocketServer.UnixStreamServer
+        else:
+            server_class = _TCPServer
+        self.server = server_class(sockaddr, WorkerHandler)
+        self.server.run_case = self.run_case
+        self.server.heartbeat = heartbeat
+
+    def run_case(self, filename, suite_name, case_name):
+        """
+        Runs the named test case and returns ``True`` if it passed. Only test
+        suites loaded when the worker started are used; nothing is imported
+        because a coordinator asked for it.
+        """
+        suite = self._suites.get((filename, suite_name))
+        if suite is None:
+            self._logger.error("Refusing to run {0}: test suite {1} in {2} was "
+                               "not loaded by this worker".format(
+                    case_name, suite_name, filename))
+            return False
+
+        try:
+            return suite.run_case(case_name)
+        except Exception as e:
+            self._logger.error("Test case {0} raised {1!r}".format(case_name,
+                                                                    e))
+            return False
+
+    def serve_forever(self):
+        """
+        Serves coordinators, one at a time, untill :meth:`shutdown` is called.
+        """
+        self.server.serve_forever()
+
+    def shutdown(self):
+        """
+        Stops serving, from another thread.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+class WorkerDied(Exception):
+    """
+    Raised when a worker can't be reached, or stops responding.
+    """
+
+class Coordinator():
+    """
+    Runs test cases on the workers at ``addresses``, ``batch_size`` test cases
+    at a time. A worker that sends nothing for ``timeout`` seconds is taken to
+    be dead. A test case is given to at most ``attempts`` workers before it is
+    counted as a failure, so that a test case that kills workers can't kill
+    them all.
+    """
+
+    def __init__(self, addresses, batch_size=4, timeout=10.0, attempts=2,
+                 logger=None):
+        self.addresses = list(addresses)
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.attempts = attempts
+        self._logger = logger or logging.getLogger("dectest.coordinator")
+
+    def run(self, cases, maxfail=None):
+        """
+        Runs the test cases in ``cases``, a list of tuples as returned by
+        :func:`case_key`, and returns a dict mapping each test case that was
+        run to ``True`` if it passed. Once ``maxfail`` test cases have failed,
+        no more are handed out.
+        """
+        self._results = {}
+        self._fails = 0
+        self._maxfail = maxfail
+        self._tries = collections.Counter()
+        self._orphans = collections.deque()
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._queues = [collections.deque() for address in self.addresses]
+        for i, case in enumerate(cases):
+            self._queues[i % len(self._queues)].append(tuple(case))
+
+        threads = [threading.Thread(target=self._drive, args=(i, address))
+                   for i, address in enumerate(self.addresses)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if not self._stopped():
+            for case in self._remaining():
+                self._logger.error("No workers left to run {0}".format(case[2]))
+                self._results[case] = False
+        return self._results
+
+    def _stopped(self):
+        return self._maxfail and self._fails >= self._maxfail
+
+    def _remaining(self):
+        """
+        Returns the test cases that are still queued.
+        """
+        remaining = list(self._orphans)
+        for queue in self._queues:
+            remaining.extend(queue)
+        return remaining
+
+    def _take(self, i):
+        """
+        Returns the next batch for worker ``i``, waiting while other workers
+        might still hand back test cases. Returns ``None`` when there is
+        nothing left to do.
+        """
+        with self._condition:
+            while True:
+                if self._stopped():
+                    return None
+
+                batch = []
+                queue = self._queues[i]
+                for source in (self._orphans, queue):
+                    while source and len(batch) < self.batch_size:
+                        batch.append(source.popleft())
+
+                if not batch:
+                    # Steal half of the busiest queue, from the far end
+                    victim = max(self._queues, key=len)
+                    for j in range((len(victim) + 1) // 2):
+                        queue.appendleft(victim.pop())
+                    while queue and len(batch) < self.batch_size:
+                        batch.append(queue.popleft())
+
+                if batch:
+                    self._in_flight += len(batch)
+                    return batch
+                if not self._in_flight:
+                    return None
+                self._condition.wait()
+
+    def _finish(self, batch, results):
+        """
+        Records the ``results`` of a batch.
+        """
+        with self._condition:
+            for filename, suite_name, case_name, passed in results:
+                self._results[(filename, suite_name, case_name)] = passed
+                if not passed:
+                    self._fails += 1
+            self._in_flight -= len(batch)
+            self._condition.notify_all()
+
+    def _abandon(self, i, batch):
+        """
+        Hands the batch, and the queue, of dead worker ``i`` to the others.
+        """
+        with self._condition:
+            self._in_flight -= len(batch)
+            for case in batch:
+                self._tries[case] += 1
+                if self._tries[case] >= self.attempts:
+                    self._logger.error("Test case {0} was lost by {1} workers"
+                                       .format(case[2], self._tries[case]))
+                    self._results[case] = False
+                    self._fails += 1
+                else:
+                    self._orphans.append(case)
+            self._orphans.extend(self._queues[i])
+            self._queues[i].clear()
+            self._condition.notify_all()
+
+    def _drive(self, i, address):
+        """
+        Feeds batches to the worker at ``address`` untill there are none left,
+        or the worker dies.
+        """
+        batch = []
+        try:
+            connection = self._connect(address)
+        except WorkerDied as e:
+            self._logger.warning(str(e))
+            self._abandon(i, batch)
+            return
+
+        try:
+            while True:
+                batch = self._take(i)
+                if batch is None:
+                    return
+                self._finish(batch, self._run_batch(connection, address,
+                                                    batch))
+        except WorkerDied as e:
+            self._logger.warning(str(e))
+            self._abandon(i, batch)
+        finally:
+            connection.close()
+
+    def _connect(self, address):
+        """
+        Connects to the worker at ``address``.
+        """
+        family, sockaddr = parse_address(address)
+        connection = socket.socket(family, socket.SOCK_STREAM)
+        connection.settimeout(self.timeout)
+        try:
+            connection.connect(sockaddr)
+        except socket.error as e:
+            connection.close()
+            raise WorkerDied("Could not connect to worker {0}: {1}".format(
+                    address, e))
+        return connection
+
+    def _run_batch(self, connection, address, batch):
+        """
+        Sends a batch to a worker and returns the results, once they come.
+        """
+        rfile = connection.makefile("rb")
+        try:
+            connection.sendall(json.dumps({"op": "run",
+                                           "cases": batch}) + "\n")
+            while True:
+                message = receive(rfile)
+                if message is None:
+                    raise WorkerDied("Worker {0} closed the connection".format(
+                            address))
+                if message["op"] == "results":
+                    return [tuple(result) for result in message["results"]]
+        except (socket.error, ValueError) as e:
+            raise WorkerDied("Lost worker {0}: {1}".format(address, e))
+        finally:
+            rfile.close()
+
+def make_parser():
+    """
+    Returns the argument parser for the worker daemon.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m dectest worker",
+        description="Run test cases sent by dectest coordinators.")
+    parser.add_argument("address", nargs="?",
+                        default="localhost:{0}".format(DEFAULT_PORT),
+                        help="host:port or unix:<path> to listen on")
+    parser.add_argument("paths", nargs="*", default=["."],
+                        help="files or directories of the test suites to "
+                        "import when the worker starts, and to run test cases "
+                        "from")
+    parser.add_argument("--heartbeat", type=float, default=1.0,
+                        help="seconds between heartbeats while running a "
+                        "batch")
+    return parser
+
+def main(argv=None):
+    """
+    The entry point of the worker daemon. Returns the exit status.
+    """
+    args = make_parser().parse_args(argv)
+    logging.basicConfig()
+    worker = Worker(args.address, args.paths, args.heartbeat)
+    try:
+        worker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,217 @@
+"""
+A history of how long each test case takes, used to catch test cases that have
+become slower. When the ``history.file`` config value is set,
+:meth:`~dectest.suite.TestSuite.test` takes ``history.repeats`` timings of the
+tested function of each test case that passes, each timing being the mean of a
+batch of calls lasting at least ``history.batchtime`` seconds, and appends them
+to the file as a line of JSON, tagged with the git revision and a fingerprint
+of the machine. Runs of only some of the test cases are not appended, so that
+they don't push full runs out of the window compared with.
+
+The timings of each test case are compared with the timings from the last
+``history.window`` runs of the same suite on the same machine. Timings are
+noisy, so a test case is only flagged as slower if the Mann-Whitney U test
+finds the new timings to be larger than the old with a p value below
+``history.alpha``, and the median has grown by more than three times the
+median absolute deviation of the old timings. A flagged test case fails if it's
+median has grown by more than the fraction ``history.threshold``.
+"""
+
+import collections
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from . import perf
+
+# The scale factor that makes the median absolute deviation an estimate of the
+# standard deviation of normally distributed values
+MAD_SCALE = 1.4826
+
+Regression = collections.namedtuple(
+    "Regression", ["name", "old_median", "new_median", "slowdown", "p",
+                   "failed"])
+
+def git_revision(directory=None):
+    """
+    Returns the git revision checked out in ``directory``, or the current
+    directory, or ``None`` if it is not in a git repository.
+    """
+    try:
+        with open(os.devnull, "w") as devnull:
+            output = subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                             cwd=directory, stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.strip() or None
+
+def machine_fingerprint():
+    """
+    Returns a short hash of the machine's name, architecture, processor, number
+    of cpus and python version, so that timings are only compared with timings
+    from the same setup.
+    """
+    try:
+        cpus = multiprocessing.cpu_count()
+    except NotImplementedError:
+        cpus = 0
+    parts = [platform.node(), platform.machine(), platform.processor(),
+             str(cpus), platform.python_implementation(),
+             platform.python_version()]
+    return hashlib.sha1("\0".join(parts)).hexdigest()[:12]
+
+def median(values):
+    """
+    Returns the median of ``values``.
+    """
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+def mad(values):
+    """
+    Returns the median absolute deviation of ``values``.
+    """
+    centre = median(values)
+    return median([abs(value - centre) for value in values])
+
+def mann_whitney(old, new):
+    """
+    Returns the one sided p value of the Mann-Whitney U test that the values in
+    ``new`` tend to be larger than those in ``old``, using the normal
+    approximation with a correction for ties.
+    """
+    n1, n2 = len(old), len(new)
+    ranked = sorted([(value, 0) for value in old] +
+                    [(value, 1) for value in new])
+
+    # Give tied values the mean of the ranks they span
+    new_ranks = 0.0
+    tie_term = 0.0
+    i = 0
+    while i < len(ranked):
+        j = i
+        while j + 1 < len(ranked) and ranked[j + 1][0] == ranked[i][0]:
+            j += 1
+        rank = (i + j) / 2.0 + 1
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        new_ranks += rank * sum(group for value, group in ranked[i:j + 1])
+        i = j + 1
+
+    u = new_ranks - n2 * (n2 + 1) / 2.0
+    n = n1 + n2
+    variance = n1 * n2 / 12.0 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2.0 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+class History():
+    """
+    The append only history file at ``filename``. Each line is a JSON object
+    recording the timings of one run of a test suite.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def append(self, suite_name, timings, revision=None, machine=None):
+        """
+        Appends a run of the suite named ``suite_name``. ``timings`` is a dict
+        mapping the names of test cases to lists of durations in seconds.
+        """
+        record = {
+            "suite": suite_name,
+            "time": time.time(),
+            "revision": revision,
+            "machine": machine,
+            "cases": timings,
+            }
+        with open(self.filename, "a") as f:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+
+    def runs(self, suite_name, machine=None):
+        """
+        Returns the recorded runs of the suite named ``suite_name``, oldest
+        first, on the machine with the fingerprint ``machine`` if it is given.
+        Lines that can't be read, such as one cut short by a crash, are
+        skipped.
+        """
+        runs = []
+        try:
+            f = open(self.filename)
+        except IOError:
+            return runs
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("suite") != suite_name:
+                    continue
+                if machine is not None and record.get("machine") != machine:
+                    continue
+                runs.append(record)
+        return runs
+
+    def baseline(self, suite_name, machine=None, window=10):
+        """
+        Returns a dict mapping the names of test cases to all of their timings
+        from the last ``window`` runs.
+        """
+        baseline = {}
+        for record in self.runs(suite_name, machine)[-window:]:
+            for name, durations in record["cases"].items():
+                baseline.setdefault(name, []).extend(durations)
+        return baseline
+
+def compare(baseline, timings, alpha=0.01, threshold=0.2, min_samples=5):
+    """
+    Returns a list of a :data:`Regression` for each test case in ``timings``
+    that has become slower than it was in ``baseline``, both being dicts
+    mapping names to lists of durations. Test cases with fewer than
+    ``min_samples`` old timings are not compared.
+    """
+    regressions = []
+    for name, new in sorted(timings.items()):
+        old = baseline.get(name)
+        if not new or not old or len(old) < min_samples:
+            continue
+
+        old_median = median(old)
+        new_median = median(new)
+        if new_median - old_median <= 3 * MAD_SCALE * mad(old):
+            continue
+        p = mann_whitney(old, new)
+        if p >= alpha:
+            continue
+
+        slowdown = new_median / old_median - 1 if old_median else float("inf")
+        regressions.append(Regression(name, old_median, new_median, slowdown,
+                                      p, slowdown > threshold))
+    return regressions
+
+def print_regressions(regressions, stream=None):
+    """
+    Prints a table of ``regressions``.
+    """
+    stream = stream or sys.stdout
+    stream.write("{0:<30} {1:>10} {2:>10} {3:>8} {4:>8}\n".format(
+            "Test case", "Before", "After", "Change", "p"))
+    for regression in regressions:
+        stream.write("{0:<30} {1:>10} {2:>10} {3:>+7.0%} {4:>8.2g}{5}\n".format(
+                regression.name[-30:],
+                perf.format_duration(regression.old_median),
+                perf.format_duration(regression.new_median),
+                regression.slowdown, regression.p,
+                " FAILED" if regression.failed else ""))
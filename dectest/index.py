@@ -0,0 +1,125 @@
+"""
+A persistent index of the test cases registered by each module. Importing
+every module to find out which test cases it registers is the slowest part of a
+short test run, so the command line runner stores what it finds in an index
+file. As long as a module's modification time and size are unchanged, the
+index is trusted, and the module is only imported if one of it's test cases is
+going to be run.
+"""
+
+import json
+import os
+
+VERSION = 2
+
+def stat_key(filename):
+    """
+    Returns the modification time and size of ``filename``, which are used to
+    tell if the file has changed since it was indexed.
+    """
+    st = os.stat(filename)
+    return [st.st_mtime, st.st_size]
+
+def make_entry(filename, module, suites):
+    """
+    Returns an index entry for the file ``filename``, which was imported as the
+    module named ``module`` and contains the test suites ``suites``. ``module``
+    may be ``None`` for files that do not register any test cases.
+    """
+    return {
+        "stat": stat_key(filename),
+        "module": module,
+        "suites": [{"name": suite.name,
+                    "cases": [tc.describe() for name, tc in
+                              sorted(suite.get_testcases().items())]}
+                   for suite in suites],
+        }
+
+class CollectionIndex():
+    """
+    Maps the path of a module, along with it's modification time and size, to
+    the test suites and test cases that the module registers.
+
+    Each entry is a dict with the keys ``module`` (the module name) and
+    ``suites``, a list of dicts with the keys ``name`` and ``cases``. The
+    ``cases`` list holds the metadata returned by
+    :meth:`~dectest.suite.TestCase.describe` for every test case in the suite.
+    """
+
+    def __init__(self, filename):
+        """
+        Set the filename, and load the index if it exists.
+        """
+        self.filename = filename
+        self.entries = {}
+        self.changed = False
+        self.load()
+
+    def load(self):
+        """
+        Loads the index from it's file. A missing or unreadable index file
+        results in an empty index.
+        """
+        try:
+            with open(self.filename) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            self.entries = {}
+            return
+
+        if data.get("version") != VERSION:
+            self.entries = {}
+        else:
+            self.entries = data.get("modules", {})
+
+    def save(self):
+        """
+        Writes the index to it's file, if it has changed. The index is written
+        to a temporary file first, so that readers never see a partial index.
+        """
+        if not self.changed:
+            return
+
+        tmp = self.filename + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": VERSION, "modules": self.entries}, f)
+        os.rename(tmp, self.filename)
+        self.changed = False
+
+    def lookup(self, filename):
+        """
+        Returns the entry for ``filename`` if it is in the index and the file
+        has not changed since, otherwise ``None``.
+        """
+        path = os.path.abspath(filename)
+        entry = self.entries.get(path)
+        if entry is None:
+            return
+
+        try:
+            if entry["stat"] != stat_key(path):
+                return
+        except OSError:
+            return
+        return entry
+
+    def update(self, filename, module, suites):
+        """
+        Records the test suites registered by the module ``module``, which was
+        loaded from ``filename``, and returns the new entry. ``module`` may be
+        ``None`` for files that do not register any test cases.
+        """
+        path = os.path.abspath(filename)
+        entry = make_entry(path, module, suites)
+        self.entries[path] = entry
+        self.changed = True
+        return entry
+
+    def prune(self):
+        """
+        Removes the entries for files that no longer exist.
+        """
+        for path in list(self.entries):
+            if not os.path.exists(path):
+                del self.entries[path]
+                self.changed = True
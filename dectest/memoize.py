@@ -0,0 +1,122 @@
+"""
+Memoisation of tested functions that the :class:`~dectest.sideaffects.Pure`
+side affect test has shown to be pure. A :class:`MemoCache` is installed by the
+:class:`~dectest.suite.TestSuite` once every test case of a function has
+passed, and is then used by the wrapper around the function.
+"""
+
+import collections
+import copy
+import threading
+
+from . import perf
+
+IMMUTABLE_TYPES = (type(None), bool, int, long, float, complex, str, unicode)
+
+def make_key(args, kwargs):
+    """
+    Returns a cache key for a call with ``args`` and ``kwargs``, including the
+    type of each argument, as ``functools.lru_cache(typed=True)`` does.
+    """
+    items = tuple(sorted(kwargs.items()))
+    return (args, items, tuple(type(arg) for arg in args),
+            tuple(type(value) for name, value in items))
+
+def is_immutable(value):
+    """
+    Returns ``True`` if ``value`` is a number, string or ``None``, or a tuple
+    or frozenset of only those, so that it can be shared between callers
+    without copying it.
+    """
+    if isinstance(value, IMMUTABLE_TYPES):
+        return True
+    if isinstance(value, (tuple, frozenset)):
+        return all(is_immutable(item) for item in value)
+    return False
+
+class MemoCache():
+    """
+    A cache of the results of a function, keeping at most ``maxsize`` results
+    and evicting the least recently used. If ``ttl`` is given, results are only
+    used for that many seconds after they were computed.
+
+    The type of each argument is part of the key, so calls with arguments
+    that are equal but of different types, such as ``1``, ``1.0`` and
+    ``True``, are cached separately. Calls whose arguments can't be hashed are
+    not cached. The ``hits``, ``misses`` and ``uncacheable`` attributes count
+    each kind of call, and ``listener``, if it is given, is called with
+    ``True`` for each hit and ``False`` for each miss.
+
+    Results that aren't immutable, as decided by :func:`is_immutable`, are
+    copied with ``copy.deepcopy`` when they are stored and again each time they
+    are returned from the cache, so a caller that changes a result it was given
+    can't change the results given to later callers.
+    """
+
+    def __init__(self, maxsize=128, ttl=None, listener=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.listener = listener
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def call(self, func, args, kwargs):
+        """
+        Returns the result of calling ``func`` with ``args`` and ``kwargs``,
+        from the cache if it can.
+        """
+        try:
+            key = make_key(args, kwargs)
+            hash(key)
+        except TypeError:
+            with self._lock:
+                self.uncacheable += 1
+            return func(*args, **kwargs)
+
+        now = perf.clock() if self.ttl is not None else None
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and (now is None or now - entry[1] < self.ttl):
+                # Put it back as the most recently used
+                self._entries[key] = entry
+                self.hits += 1
+                hit = True
+            else:
+                self.misses += 1
+                hit = False
+        if self.listener is not None:
+            self.listener(hit)
+        if hit:
+            value, computed, shared = entry
+            return value if shared else copy.deepcopy(value)
+
+        value = func(*args, **kwargs)
+        shared = is_immutable(value)
+        stored = value if shared else copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (stored, now, shared)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def hit_rate(self):
+        """
+        Returns the fraction of cacheable calls that were hits, or ``None`` if
+        there have been none.
+        """
+        calls = self.hits + self.misses
+        if calls:
+            return float(self.hits) / calls
+
+    def clear(self):
+        """
+        Empties the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,351 @@
+"""
+Metrics for monitoring dectest, particularly when test cases are run while a
+long lived service calls the tested functions. When the ``metrics.enabled``
+config value is true, every :class:`~dectest.suite.TestSuite` records the
+following in the global :data:`METRICS` registry, labelled by suite and test
+case:
+
+* ``dectest_runs_total`` - the number of times each test case was run.
+* ``dectest_passes_total`` - the number of times each test case passed.
+* ``dectest_failures_total`` - the number of times each test case failed.
+* ``dectest_test_duration_seconds`` - a histogram of how long each test case
+  took to run.
+* ``dectest_wrapper_overhead_seconds`` - a histogram, labelled by suite only,
+  of the time spent in the wrapper around tested functions, including any
+  tests it runs, but not the call to the function itself. This is only
+  recorded if the ``metrics.overhead`` config value is also true, as it adds
+  to the cost of every call.
+* ``dectest_cache_hits_total`` and ``dectest_cache_misses_total`` - the
+  number of calls of each memoised function, labelled by suite and function,
+  that were and were not answered from it's cache. See
+  :class:`~dectest.sideaffects.Pure`.
+
+The metrics can be exported in the Prometheus text format, either written to a
+file with :func:`write_prometheus` or served over HTTP with
+:func:`serve_prometheus`, or sent to statsd with a :class:`StatsdEmitter`.
+"""
+
+import atexit
+import BaseHTTPServer
+import os
+import socket
+import threading
+
+from . import perf
+
+class Counter():
+    """
+    A count of events for each combination of label values.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels, registry):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self._registry = registry
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        """
+        Adds ``amount`` to the count for the tuple of ``label_values``.
+        """
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + \
+                amount
+        self._registry._notify(self, label_values, amount)
+
+class Histogram():
+    """
+    A :class:`~dectest.perf.Histogram` of durations, in seconds, for each
+    combination of label values.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels, registry):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self._registry = registry
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        """
+        Records ``value`` for the tuple of ``label_values``.
+        """
+        with self._lock:
+            histogram = self.values.get(label_values)
+            if histogram is None:
+                histogram = self.values[label_values] = perf.Histogram()
+            histogram.observe(value)
+        self._registry._notify(self, label_values, value)
+
+class MetricsRegistry():
+    """
+    Holds a set of metrics. Listeners, such as :class:`StatsdEmitter`, can be
+    added to be told of every update to a metric.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.listeners = []
+
+    def counter(self, name, help, labels=()):
+        """
+        Returns the :class:`Counter` named ``name``, creating it if needed.
+        """
+        return self._get(Counter, name, help, labels)
+
+    def histogram(self, name, help, labels=()):
+        """
+        Returns the :class:`Histogram` named ``name``, creating it if needed.
+        """
+        return self._get(Histogram, name, help, labels)
+
+    def add_listener(self, listener):
+        """
+        Adds a listener. It's ``update(metric, label_values, value)`` method
+        is called after each update, and it's ``flush()`` method, if it has
+        one, by :meth:`flush`.
+        """
+        self.listeners.append(listener)
+
+    def flush(self):
+        """
+        Tells the listeners to send any updates they are holding back.
+        :meth:`~dectest.suite.TestSuite.test` calls this when it finishes.
+        """
+        for listener in self.listeners:
+            flush = getattr(listener, "flush", None)
+            if flush is not None:
+                flush()
+
+    def _get(self, metric_class, name, help, labels):
+        """
+        Returns the metric named ``name``, creating it if needed.
+        """
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics.setdefault(
+                name, metric_class(name, help, tuple(labels), self))
+        return metric
+
+    def _notify(self, metric, label_values, value):
+        """
+        Tells the listeners of an update.
+        """
+        for listener in self.listeners:
+            listener.update(metric, label_values, value)
+
+METRICS = MetricsRegistry()
+
+def record_test(suite_name, case_name, passed, duration, registry=METRICS):
+    """
+    Records a run of a test case.
+    """
+    labels = (suite_name, case_name)
+    registry.counter("dectest_runs_total", "Test case runs.",
+                     ("suite", "case")).inc(labels)
+    if passed:
+        registry.counter("dectest_passes_total", "Test case passes.",
+                         ("suite", "case")).inc(labels)
+    else:
+        registry.counter("dectest_failures_total", "Test case failures.",
+                         ("suite", "case")).inc(labels)
+    registry.histogram("dectest_test_duration_seconds",
+                       "Time taken to run test cases.",
+                       ("suite", "case")).observe(labels, duration)
+
+def record_overhead(suite_name, duration, registry=METRICS):
+    """
+    Records the time spent in the wrapper around a tested function.
+    """
+    registry.histogram("dectest_wrapper_overhead_seconds",
+                       "Time spent in the wrapper around tested functions, "
+                       "including any tests it ran.",
+                       ("suite",)).observe((suite_name,), duration)
+
+def record_cache(suite_name, function_name, hit, registry=METRICS):
+    """
+    Records a call of a memoised function, and whether it was a cache hit.
+    """
+    labels = (suite_name, function_name)
+    if hit:
+        registry.counter("dectest_cache_hits_total",
+                         "Memoised calls answered from the cache.",
+                         ("suite", "function")).inc(labels)
+    else:
+        registry.counter("dectest_cache_misses_total",
+                         "Memoised calls that called the function.",
+                         ("suite", "function")).inc(labels)
+
+def _escape(value):
+    """
+    Escapes a label value for the Prometheus text format.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace(
+        "\n", "\\n")
+
+def _labels(names, values, extra=()):
+    """
+    Formats a set of labels for the Prometheus text format.
+    """
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(name, _escape(value))
+                          for name, value in pairs) + "}"
+
+def format_prometheus(registry=METRICS):
+    """
+    Returns the metrics in ``registry`` in the Prometheus text format.
+    """
+    lines = []
+    for name, metric in sorted(registry.metrics.items()):
+        lines.append("# HELP {0} {1}".format(name, metric.help))
+        lines.append("# TYPE {0} {1}".format(name, metric.kind))
+        for label_values, value in sorted(metric.values.items()):
+            if metric.kind == "counter":
+                lines.append("{0}{1} {2}".format(
+                        name, _labels(metric.labels, label_values), value))
+                continue
+
+            cumulative = 0
+            for bound, count in zip(value.bounds, value.counts):
+                cumulative += count
+                lines.append("{0}_bucket{1} {2}".format(
+                        name, _labels(metric.labels, label_values,
+                                      [("le", repr(bound))]), cumulative))
+            lines.append("{0}_bucket{1} {2}".format(
+                    name, _labels(metric.labels, label_values,
+                                  [("le", "+Inf")]), value.count))
+            lines.append("{0}_sum{1} {2!r}".format(
+                    name, _labels(metric.labels, label_values), value.sum))
+            lines.append("{0}_count{1} {2}".format(
+                    name, _labels(metric.labels, label_values), value.count))
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(filename, registry=METRICS):
+    """
+    Writes the metrics in ``registry`` to ``filename`` in the Prometheus text
+    format, as read by the node exporter's textfile collector. The file is
+    replaced atomically.
+    """
+    tmp = filename + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(format_prometheus(registry))
+    os.rename(tmp, filename)
+
+def serve_prometheus(port, host="127.0.0.1", registry=METRICS):
+    """
+    Serves the metrics in ``registry`` over HTTP from a daemon thread, and
+    returns the server. Call ``shutdown()`` on the server to stop it.
+    """
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = format_prometheus(registry)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            return
+
+    server = BaseHTTPServer.HTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+class StatsdEmitter():
+    """
+    Sends metric updates to statsd over UDP. Counters are sent as statsd
+    counters, and histograms as timers in milliseconds. Label values are
+    appended to the metric name, separated by dots.
+
+    Updates are batched into packets of at most ``max_packet`` bytes, and sent
+    when the packet is full, when :meth:`flush` is called, and every
+    ``flush_interval`` seconds by a daemon thread, unless ``flush_interval`` is
+    ``None``. Anything still queued is sent when the program exits, or when
+    :meth:`close` is called.
+
+    >>> METRICS.add_listener(StatsdEmitter("localhost", 8125))
+    """
+
+    def __init__(self, host="localhost", port=8125, prefix="dectest",
+                 max_packet=1432, flush_interval=1.0):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.max_packet = max_packet
+        self.flush_interval = flush_interval
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._lines = []
+        self._size = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        atexit.register(self.flush)
+        if flush_interval is not None:
+            thread = threading.Thread(target=self._flush_periodically)
+            thread.daemon = True
+            thread.start()
+
+    def update(self, metric, label_values, value):
+        """
+        Queues an update to be sent.
+        """
+        parts = [self.prefix, metric.name]
+        parts.extend(str(v).replace(".", "_").replace(":", "_")
+                     for v in label_values)
+        if metric.kind == "counter":
+            line = "{0}:{1}|c".format(".".join(parts), value)
+        else:
+            line = "{0}:{1:.3f}|ms".format(".".join(parts), value * 1000)
+
+        with self._lock:
+            if self._size + len(line) + 1 > self.max_packet:
+                self._send()
+            self._lines.append(line)
+            self._size += len(line) + 1
+
+    def flush(self):
+        """
+        Sends any queued updates.
+        """
+        with self._lock:
+            self._send()
+
+    def close(self):
+        """
+        Sends any queued updates, and stops sending updates.
+        """
+        self._closed.set()
+        self.flush()
+        self._socket.close()
+
+    def _flush_periodically(self):
+        """
+        Flushes every ``flush_interval`` seconds untill :meth:`close` is
+        called.
+        """
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def _send(self):
+        """
+        Sends the queued updates. Must be called with the lock held.
+        """
+        if not self._lines:
+            return
+        packet = "\n".join(self._lines)
+        self._lines = []
+        self._size = 0
+        try:
+            self._socket.sendto(packet, self.address)
+        except socket.error:
+            pass
@@ -0,0 +1,329 @@
+"""
+Timing and load generation helpers, used by the performance side affect tests
+in :mod:`dectest.sideaffects`.
+"""
+
+import bisect
+import math
+import multiprocessing
+import Queue
+import threading
+import timeit
+import traceback
+
+clock = timeit.default_timer
+
+def log_bounds(low=1e-6, high=10.0, per_decade=4):
+    """
+    Returns a list of bucket bounds, in seconds, spaced logarithmically between
+    ``low`` and ``high`` with ``per_decade`` buckets for each power of ten.
+    """
+    count = int(round(math.log10(high / low) * per_decade))
+    return [low * 10 ** (float(i) / per_decade) for i in range(count + 1)]
+
+DEFAULT_BOUNDS = log_bounds()
+
+class Histogram():
+    """
+    A histogram of durations, with fixed bucket bounds so that histograms from
+    different threads and processes can be merged. ``counts[i]`` is the number
+    of observations no greater than ``bounds[i]``, and not counted in an
+    earlier bucket; the last count is for observations above every bound.
+    """
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """
+        Records a single observation.
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other):
+        """
+        Adds the observations of ``other``, which must have the same bounds.
+        """
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    def mean(self):
+        """
+        Returns the mean of the observations, or ``None`` if there are none.
+        """
+        if self.count:
+            return self.sum / self.count
+
+    def percentile(self, fraction):
+        """
+        Returns the upper bound of the bucket containing the given fraction of
+        the observations, or ``None`` if there are no observations.
+        """
+        if not self.count:
+            return
+        target = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+
+class LoadError(Exception):
+    """
+    Raised when the function being driven by a load test raises an exception,
+    or a load test process dies.
+    """
+
+class LoadResult():
+    """
+    The result of driving a function from ``workers`` threads or processes, as
+    given by ``kind``, for ``duration`` seconds.
+    """
+
+    def __init__(self, kind, workers, duration, histogram):
+        self.kind = kind
+        self.workers = workers
+        self.duration = duration
+        self.histogram = histogram
+        self.efficiency = None
+
+    @property
+    def calls(self):
+        """
+        The total number of calls made.
+        """
+        return self.histogram.count
+
+    @property
+    def throughput(self):
+        """
+        The number of calls made per second.
+        """
+        return self.calls / self.duration
+
+    def __repr__(self):
+        return "<LoadResult {0} {1}: {2:.1f} calls/s>".format(
+            self.workers, self.kind, self.throughput)
+
+def _drive(func, deadline, histogram):
+    """
+    Calls ``func`` repeatedly untill ``deadline``, recording the duration of
+    each call in ``histogram``.
+    """
+    observe = histogram.observe
+    now = clock()
+    while now < deadline:
+        func()
+        end = clock()
+        observe(end - now)
+        now = end
+
+def _drive_thread(func, deadline, histogram, errors):
+    """
+    The body of a load test thread. Appends the traceback of any exception
+    raised by ``func`` to ``errors``.
+    """
+    try:
+        _drive(func, deadline, histogram)
+    except Exception:
+        errors.append(traceback.format_exc())
+
+def _drive_process(func, duration, queue):
+    """
+    The body of a load test process. Puts a tuple of the histogram of it's
+    calls and ``None`` on ``queue``, or of ``None`` and the traceback if
+    ``func`` raises an exception.
+    """
+    histogram = Histogram()
+    try:
+        _drive(func, clock() + duration, histogram)
+    except Exception:
+        queue.put((None, traceback.format_exc()))
+    else:
+        queue.put((histogram, None))
+
+def run_threads(func, workers, duration):
+    """
+    Calls ``func`` from ``workers`` threads for ``duration`` seconds, and
+    returns a :class:`LoadResult`. Raises :class:`LoadError` if ``func``
+    raises an exception.
+    """
+    histograms = [Histogram() for i in range(workers)]
+    errors = []
+    start = clock()
+    deadline = start + duration
+    threads = [threading.Thread(target=_drive_thread,
+                                args=(func, deadline, histograms[i], errors))
+               for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise LoadError("The load tested function raised:\n" + errors[0])
+
+    histogram = Histogram()
+    for h in histograms:
+        histogram.merge(h)
+    return LoadResult("threads", workers, clock() - start, histogram)
+
+def run_processes(func, workers, duration):
+    """
+    Calls ``func`` from ``workers`` forked processes for ``duration`` seconds,
+    and returns a :class:`LoadResult`. Raises :class:`LoadError` if ``func``
+    raises an exception, or a process dies without reporting back.
+    """
+    queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_drive_process,
+                                         args=(func, duration, queue))
+                 for i in range(workers)]
+    start = clock()
+    for process in processes:
+        process.start()
+
+    reports = []
+    while len(reports) < workers:
+        try:
+            reports.append(queue.get(timeout=0.5))
+        except Queue.Empty:
+            # Once every process has exited, anything they sent has arrived
+            if not any(process.is_alive() for process in processes):
+                try:
+                    reports.append(queue.get(timeout=0.5))
+                except Queue.Empty:
+                    break
+    for process in processes:
+        process.join()
+
+    errors = [error for h, error in reports if error is not None]
+    if errors:
+        raise LoadError("The load tested function raised:\n" + errors[0])
+    if len(reports) < workers:
+        codes = [process.exitcode for process in processes if process.exitcode]
+        raise LoadError("A load test process exited with status {0}".format(
+                codes[0] if codes else "unknown"))
+
+    histogram = Histogram()
+    for h, error in reports:
+        histogram.merge(h)
+    return LoadResult("processes", workers, clock() - start, histogram)
+
+def load_test(func, threads=(1, 2, 4, 8), processes=(1,), duration=2):
+    """
+    Drives ``func`` with each number of ``threads`` and ``processes`` in turn,
+    and returns the list of :class:`LoadResult` objects. The ``efficiency`` of
+    each result is it's throughput divided by the throughput the smallest
+    number of workers of the same kind would have if it scaled perfectly.
+    """
+    results = []
+    for kind, counts, run in (("threads", threads, run_threads),
+                              ("processes", processes, run_processes)):
+        base = None
+        for workers in sorted(counts):
+            result = run(func, workers, duration)
+            if base is None:
+                base = result
+            if base.throughput:
+                result.efficiency = (result.throughput * base.workers /
+                                     (base.throughput * workers))
+            results.append(result)
+    return results
+
+def format_load_results(results):
+    """
+    Returns a table of the given :class:`LoadResult` objects as a string.
+    """
+    lines = ["{0:>10} {1:>7} {2:>12} {3:>10} {4:>10} {5:>10} {6:>10}".format(
+            "kind", "workers", "calls/s", "mean", "p50", "p99", "efficiency")]
+    for result in results:
+        histogram = result.histogram
+        lines.append(
+            "{0:>10} {1:>7} {2:>12.1f} {3:>10} {4:>10} {5:>10} {6:>10}".format(
+                result.kind, result.workers, result.throughput,
+                format_duration(histogram.mean()),
+                format_duration(histogram.percentile(0.5)),
+                format_duration(histogram.percentile(0.99)),
+                "-" if result.efficiency is None else
+                "{0:.0%}".format(result.efficiency)))
+    return "\n".join(lines)
+
+def time_batch(func, number):
+    """
+    Returns the number of seconds taken to call ``func`` ``number`` times.
+    """
+    loop = range(number)
+    start = clock()
+    for i in loop:
+        func()
+    return clock() - start
+
+def calibrate(func, min_time=0.01):
+    """
+    Returns a number of calls to ``func`` that takes at least ``min_time``
+    seconds, so that batches of calls can be timed accurately.
+    """
+    number = 1
+    while True:
+        if time_batch(func, number) >= min_time:
+            return number
+        number *= 2
+
+class Comparison():
+    """
+    The result of comparing the speed of two implementations. ``speedup`` is
+    the geometric mean of how many times faster the new implementation was in
+    each round, and ``low`` and ``high`` bound it's confidence interval.
+    """
+
+    def __init__(self, ratios, z=1.96):
+        self.ratios = ratios
+        logs = [math.log(ratio) for ratio in ratios]
+        mean = sum(logs) / len(logs)
+        if len(logs) > 1:
+            variance = sum((l - mean) ** 2 for l in logs) / (len(logs) - 1)
+        else:
+            variance = 0.0
+        margin = z * math.sqrt(variance / len(logs))
+        self.speedup = math.exp(mean)
+        self.low = math.exp(mean - margin)
+        self.high = math.exp(mean + margin)
+
+    def __repr__(self):
+        return "<Comparison {0:.2f}x ({1:.2f}x - {2:.2f}x)>".format(
+            self.speedup, self.low, self.high)
+
+def compare(old, new, rounds=20, min_time=0.01):
+    """
+    Times ``old`` and ``new`` in interleaved batches, alternating which runs
+    first in each round so that drifts in machine speed affect both equally,
+    and returns a :class:`Comparison` of how much faster ``new`` is.
+    """
+    number = max(calibrate(old, min_time), calibrate(new, min_time))
+    ratios = []
+    for i in range(rounds):
+        if i % 2:
+            new_time = time_batch(new, number)
+            old_time = time_batch(old, number)
+        else:
+            old_time = time_batch(old, number)
+            new_time = time_batch(new, number)
+        ratios.append(old_time / max(new_time, 1e-9))
+    return Comparison(ratios)
+
+def format_duration(seconds):
+    """
+    Formats a duration in seconds with a sensible unit.
+    """
+    if seconds is None:
+        return "-"
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return "{0:.3g}{1}".format(seconds / scale, unit)
+    return "{0:.3g}ns".format(seconds / 1e-9)
@@ -0,0 +1,173 @@
+"""
+Profiling support for dectest. Test cases already call the tested functions
+with representative inputs, so they make a good place to gather profiles. This
+module provides :class:`CaseProfiler`, which profiles a single test case, and
+:class:`ProfileReport`, which merges the profiles of many test cases into a
+single hotspot report and a collapsed stack file that can be fed to flamegraph
+tools.
+"""
+
+import collections
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+
+class StackSampler(threading.Thread):
+    """
+    A thread that periodically samples the stack of another thread, and counts
+    how often each stack is seen. The stacks are stored in the collapsed format
+    used by flamegraph tools; the frames of a stack joined by ``;``, outermost
+    frame first.
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.defaultdict(int)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """
+        Sample the target thread untill :meth:`stop` is called.
+        """
+        while not self._stop_event.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._collapse(frame)] += 1
+            time.sleep(self.interval)
+
+    def stop(self):
+        """
+        Stop sampling, and wait for the thread to finish.
+        """
+        self._stop_event.set()
+        self.join()
+
+    @staticmethod
+    def _collapse(frame):
+        """
+        Returns the collapsed representation of the stack ending at ``frame``.
+        """
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append("{0} ({1}:{2})".format(
+                    code.co_name, os.path.basename(code.co_filename),
+                    code.co_firstlineno))
+            frame = frame.f_back
+        names.reverse()
+        return ";".join(names)
+
+class CaseProfiler():
+    """
+    Profiles the execution of a single test case. The deterministic profile is
+    gathered with :mod:`cProfile`, and if ``interval`` is not ``None``, a
+    :class:`StackSampler` is run alongside it to gather stacks for a flamegraph.
+
+    >>> profiler = CaseProfiler()
+    >>> profiler.start()
+    >>> foo()
+    >>> profiler.stop()
+    >>> profiler.stats.print_stats()
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.profile = None
+        self.stats = None
+        self.stacks = {}
+        self._sampler = None
+        self._running = False
+
+    def start(self):
+        """
+        Start profiling the current thread.
+        """
+        self._running = True
+        if self.interval is not None:
+            self._sampler = StackSampler(threading.current_thread().ident,
+                                         self.interval)
+            self._sampler.start()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        """
+        Stop profiling, and store the results in the ``profile``, ``stats`` and
+        ``stacks`` attributes. Does nothing if the profiler is not running.
+        """
+        if not self._running:
+            return
+        self._running = False
+        self.profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+            self.stacks = dict(self._sampler.stacks)
+            self._sampler = None
+        self.stats = pstats.Stats(self.profile)
+
+    def dump(self, filename):
+        """
+        Writes the profile to ``filename`` in the :mod:`pstats` format.
+        """
+        self.stats.dump_stats(filename)
+
+class ProfileReport():
+    """
+    Merges the profiles of multiple test cases. The merged profile can be
+    printed as a hotspot report, or written as a collapsed stack file.
+    """
+
+    def __init__(self):
+        self.profilers = {}
+        self.stats = None
+        self.stacks = collections.defaultdict(int)
+
+    def add(self, name, profiler):
+        """
+        Adds the :class:`CaseProfiler` of the test case ``name`` to the report.
+        """
+        if profiler is None or profiler.stats is None:
+            return
+
+        self.profilers[name] = profiler
+        if self.stats is None:
+            self.stats = pstats.Stats(profiler.profile)
+        else:
+            self.stats.add(profiler.profile)
+        for stack, count in profiler.stacks.items():
+            self.stacks[stack] += count
+
+    def print_hotspots(self, stream=None, limit=20, sort="tottime"):
+        """
+        Prints the ``limit`` functions that the test cases spent the most time
+        in.
+        """
+        if self.stats is None:
+            return
+        self.stats.stream = stream or sys.stdout
+        self.stats.sort_stats(sort).print_stats(limit)
+
+    def write_collapsed(self, filename):
+        """
+        Writes the sampled stacks of every test case to ``filename`` in the
+        collapsed stack format, one stack per line followed by its count.
+        """
+        with open(filename, "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write("{0} {1}\n".format(stack, count))
+
+    def dump(self, directory):
+        """
+        Writes the profile of every test case to ``directory``, with one
+        :mod:`pstats` file per test case.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for name, profiler in self.profilers.items():
+            profiler.dump(os.path.join(directory, name + ".prof"))
@@ -0,0 +1,259 @@
+"""
+Indexes for selecting test cases by their attributes. Every test case is
+indexed under it's tags, under ``module:<name>`` for the module of the tested
+function, and under ``function:<name>`` for the name of the tested function.
+Test cases can then be selected with queries such as ``fast and not db`` or
+``module:myproject.parser or slow``.
+
+Each :class:`~dectest.suite.TestSuite` keeps an :class:`InvertedIndex` of it's
+own test cases, and every test suite is added to the global :data:`REGISTRY`,
+which indexes the test cases of all the test suites together. The registry
+keeps the test suites in it alive, so test suites that are thrown away should
+be removed with :meth:`~dectest.suite.TestSuite.unregister`.
+"""
+
+import re
+
+TOKEN_RE = re.compile(r"\s*(\(|\)|[^\s()]+)")
+OPERATORS = ("and", "or", "not")
+
+class QueryError(ValueError):
+    """
+    Raised when a selection query cannot be parsed.
+    """
+
+def make_keys(tags, module, function):
+    """
+    Returns the keys that a test case with the given tags, and the given names
+    of the module and tested function, should be indexed under.
+    """
+    keys = set(tags)
+    if module:
+        keys.add("module:" + module)
+    if function:
+        keys.add("function:" + function)
+    return keys
+
+def case_keys(tc):
+    """
+    Returns the keys that the test case ``tc`` should be indexed under. Unlike
+    :meth:`~dectest.suite.TestCase.describe`, this doesn't ``repr`` the input
+    and output, as it is called every time a test case is registered.
+    """
+    func = tc.get_function()
+    return make_keys(tc.tags, getattr(func, "__module__", None),
+                     getattr(func, "__name__", None))
+
+def description_keys(description):
+    """
+    Returns the keys that a test case should be indexed under, given it's
+    description as returned by :meth:`~dectest.suite.TestCase.describe`.
+    """
+    return make_keys(description["tags"], description["module"],
+                     description["function"])
+
+def parse(query):
+    """
+    Parses a selection query into a tree of tuples. Words are parsed to
+    ``("key", word)``, and operators to ``("not", node)``, ``("and", nodes)``
+    and ``("or", nodes)``. ``not`` binds tightest, then ``and``, then ``or``.
+    """
+    tokens = TOKEN_RE.findall(query)
+    if not tokens:
+        raise QueryError("Empty query")
+
+    position = [0]
+
+    def peek():
+        if position[0] < len(tokens):
+            return tokens[position[0]]
+
+    def take():
+        token = peek()
+        if token is None:
+            raise QueryError("Unexpected end of query " + repr(query))
+        position[0] += 1
+        return token
+
+    def parse_or():
+        nodes = [parse_and()]
+        while peek() == "or":
+            take()
+            nodes.append(parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and():
+        nodes = [parse_not()]
+        while peek() == "and":
+            take()
+            nodes.append(parse_not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_not():
+        token = take()
+        if token == "not":
+            return ("not", parse_not())
+        if token == "(":
+            node = parse_or()
+            if take() != ")":
+                raise QueryError("Unbalanced brackets in query " + repr(query))
+            return node
+        if token == ")" or token in OPERATORS:
+            raise QueryError("Unexpected {0} in query {1}".format(
+                    repr(token), repr(query)))
+        return ("key", token)
+
+    node = parse_or()
+    if peek() is not None:
+        raise QueryError("Unexpected {0} in query {1}".format(
+                repr(peek()), repr(query)))
+    return node
+
+class InvertedIndex():
+    """
+    Maps keys to the set of items indexed under them, and evaluates selection
+    queries against them.
+
+    Queries are evaluated with set operations, starting from the smallest set
+    in each ``and``, so the cost of a query is proportional to the size of the
+    sets it touches rather than to the number of items in the index. A ``not``
+    costs the smaller of the size of the set it negates and the size of the
+    result so far, and only a ``not`` with no other term in it's ``and`` needs
+    to visit every item.
+    """
+
+    def __init__(self):
+        self._keys = {}
+        self._items = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item, keys):
+        """
+        Indexes ``item`` under each of ``keys``, replacing any keys it was
+        previously indexed under.
+        """
+        self.remove(item)
+        keys = frozenset(keys)
+        self._items[item] = keys
+        for key in keys:
+            self._keys.setdefault(key, set()).add(item)
+
+    def remove(self, item):
+        """
+        Removes ``item`` from the index, if it is in it.
+        """
+        for key in self._items.pop(item, ()):
+            items = self._keys[key]
+            items.discard(item)
+            if not items:
+                del self._keys[key]
+
+    def lookup(self, key):
+        """
+        Returns the set of items indexed under ``key``. The set must not be
+        modified.
+        """
+        return self._keys.get(key, frozenset())
+
+    def keys(self):
+        """
+        Returns every key in the index.
+        """
+        return self._keys.keys()
+
+    def items(self):
+        """
+        Returns every item in the index.
+        """
+        return self._items.keys()
+
+    def select(self, query):
+        """
+        Returns the set of items matching the selection query ``query``.
+        """
+        return set(self._evaluate(parse(query)))
+
+    def _evaluate(self, node):
+        """
+        Evaluates a parsed query. The returned set may be one of the sets in
+        the index, so it must be copied before being modified.
+        """
+        kind, value = node
+        if kind == "key":
+            return self.lookup(value)
+        if kind == "not":
+            return set(self._items) - self._evaluate(value)
+        if kind == "or":
+            result = set()
+            for child in value:
+                result |= self._evaluate(child)
+            return result
+
+        positives = [self._evaluate(child) for child in value
+                     if child[0] != "not"]
+        negatives = [self._evaluate(child[1]) for child in value
+                     if child[0] == "not"]
+        if not positives:
+            positives = [set(self._items)]
+        positives.sort(key=len)
+
+        result = set(positives[0])
+        for items in positives[1:]:
+            if not result:
+                break
+            result &= items
+        for items in negatives:
+            if not result:
+                break
+            if len(items) < len(result):
+                result -= items
+            else:
+                # Removing a larger set would cost it's size, not ours
+                result = set(item for item in result if item not in items)
+        return result
+
+class Registry():
+    """
+    The global registry of test suites. Test cases are indexed as ``(suite,
+    name)`` tuples, so that a query can select test cases across every test
+    suite.
+    """
+
+    def __init__(self):
+        self.suites = []
+        self.index = InvertedIndex()
+
+    def add_suite(self, suite):
+        """
+        Adds a test suite to the registry.
+        """
+        self.suites.append(suite)
+
+    def remove_suite(self, suite):
+        """
+        Removes a test suite, and all of it's test cases, from the registry.
+        """
+        if suite in self.suites:
+            self.suites.remove(suite)
+        for name in suite.get_testcases():
+            self.index.remove((suite, name))
+
+    def add_case(self, suite, tc):
+        """
+        Indexes the test case ``tc`` of the test suite ``suite``.
+        """
+        self.index.add((suite, tc.name), case_keys(tc))
+
+    def select(self, query):
+        """
+        Returns a dict mapping each test suite to the set of names of it's test
+        cases that match ``query``.
+        """
+        selected = {}
+        for suite, name in self.index.select(query):
+            selected.setdefault(suite, set()).add(name)
+        return selected
+
+REGISTRY = Registry()
@@ -0,0 +1,310 @@
+"""
+A command line runner for dectest. The runner discovers the modules that
+contain :class:`~dectest.suite.TestSuite` instances, imports them, and runs
+the selected test cases.
+
+Discovery is made cheap by scanning the text of each file for a call to
+``register(`` before importing it, so modules that do not register any test
+cases are never imported. The scan is spread over a pool of threads. What each
+module registers is stored in a :class:`~dectest.index.CollectionIndex`, so
+that on later runs only the changed modules, and the modules whose test cases
+are selected, need to be imported.
+"""
+
+import argparse
+import fnmatch
+import os
+import sys
+from multiprocessing.pool import ThreadPool
+
+from . import index as mindex
+from . import registry
+from .suite import TestSuite
+
+MARKER = "register("
+INDEX_FILE = ".dectest_index"
+
+def find_files(paths):
+    """
+    Returns a list of the python files found at the given paths. Directories
+    are searched recursively, skipping hidden directories.
+    """
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                if filename.endswith(".py"):
+                    files.append(os.path.join(dirpath, filename))
+    return files
+
+def might_register(filename):
+    """
+    Returns ``True`` if the file at ``filename`` could register a test case,
+    judging by it's text alone.
+    """
+    try:
+        with open(filename, "rb") as f:
+            return MARKER in f.read()
+    except IOError:
+        return False
+
+def scan(files, threads=None):
+    """
+    Returns the files in ``files`` that might register a test case. The files
+    are read in a pool of ``threads`` threads.
+    """
+    if len(files) < 2:
+        return [f for f in files if might_register(f)]
+
+    pool = ThreadPool(threads)
+    try:
+        matches = pool.map(might_register, files, chunksize=64)
+    finally:
+        pool.close()
+    return [f for f, match in zip(files, matches) if match]
+
+def module_name(filename):
+    """
+    Returns a tuple of the directory that must be on ``sys.path`` to import the
+    file at ``filename``, and the name of the module it should be imported as.
+    """
+    path = os.path.abspath(filename)
+    directory, base = os.path.split(path)
+    names = [os.path.splitext(base)[0]]
+    if names[0] == "__init__":
+        names = []
+
+    while os.path.isfile(os.path.join(directory, "__init__.py")):
+        directory, package = os.path.split(directory)
+        names.insert(0, package)
+    return directory, ".".join(names)
+
+def import_file(filename):
+    """
+    Imports the file at ``filename`` and returns the module object.
+    """
+    directory, name = module_name(filename)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    __import__(name)
+    return sys.modules[name]
+
+def find_suites(module):
+    """
+    Returns the :class:`~dectest.suite.TestSuite` instances in the global
+    namespace of ``module``.
+    """
+    return [value for value in vars(module).values()
+            if isinstance(value, TestSuite)]
+
+def select_names(suite_name, names, patterns):
+    """
+    Returns the set of the test case ``names`` from the suite named
+    ``suite_name`` that match any of the glob patterns in ``patterns``. A
+    pattern may match either the name of the test case, or the name of the
+    suite and the test case joined by a ``.``. If ``patterns`` is empty, every
+    test case is selected.
+    """
+    names = set(names)
+    if not patterns:
+        return names
+
+    selected = set()
+    for name in names:
+        full_name = suite_name + "." + name
+        for pattern in patterns:
+            if fnmatch.fnmatchcase(name, pattern) or \
+                    fnmatch.fnmatchcase(full_name, pattern):
+                selected.add(name)
+                break
+    return selected
+
+def collect(paths, index=None, threads=None):
+    """
+    Returns a list of ``(filename, entry)`` tuples, one for each file at the
+    given paths that registers test cases. The entries are in the format used
+    by :class:`~dectest.index.CollectionIndex`.
+
+    Files that are unchanged since they were recorded in ``index`` are not
+    read or imported. Every other file is scanned, imported if it might
+    register a test case, and recorded in ``index``.
+    """
+    files = find_files(paths)
+    collected = []
+    stale = []
+    for filename in files:
+        entry = index.lookup(filename) if index is not None else None
+        if entry is None:
+            stale.append(filename)
+        elif entry["suites"]:
+            collected.append((filename, entry))
+
+    matches = set(scan(stale, threads))
+    for filename in stale:
+        module = None
+        suites = []
+        if filename in matches:
+            try:
+                module = import_file(filename)
+            except Exception as e:
+                sys.stderr.write("Could not import {0}: {1}\n".format(
+                        filename, e))
+                continue
+            suites = find_suites(module)
+
+        name = module.__name__ if suites else None
+        if index is not None:
+            entry = index.update(filename, name, suites)
+        else:
+            entry = mindex.make_entry(filename, name, suites)
+        if suites:
+            collected.append((filename, entry))
+    return collected
+
+def load_suite(filename, suite_name):
+    """
+    Imports the file at ``filename`` and returns the test suite in it named
+    ``suite_name``, or ``None`` if there is no such suite.
+    """
+    for suite in find_suites(import_file(filename)):
+        if suite.name == suite_name:
+            return suite
+
+def make_parser():
+    """
+    Returns the argument parser for the command line runner.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m dectest",
+        description="Discover and run dectest test cases.")
+    parser.add_argument("paths", nargs="*", default=["."],
+                        help="files or directories to search for test suites")
+    parser.add_argument("-k", dest="patterns", action="append", default=[],
+                        metavar="PATTERN",
+                        help="only run test cases matching this glob pattern")
+    parser.add_argument("-t", "--tags", dest="query", default=None,
+                        metavar="QUERY",
+                        help="only run test cases matching this selection "
+                        "query, such as 'fast and not db'")
+    parser.add_argument("-l", "--list", action="store_true",
+                        help="list the selected test cases instead of "
+                        "running them")
+    parser.add_argument("-x", "--maxfail", type=int, default=None,
+                        help="stop after this many test cases fail")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the test cases")
+    parser.add_argument("-j", "--threads", type=int, default=None,
+                        help="number of threads used to scan files")
+    parser.add_argument("--index", default=INDEX_FILE,
+                        help="the file the collection index is kept in")
+    parser.add_argument("--no-index", dest="use_index", action="store_false",
+                        help="do not read or write the collection index")
+    parser.add_argument("-w", "--watch", action="store_true",
+                        help="watch the files for changes, and re-run the "
+                        "affected test cases")
+    parser.add_argument("--poll-interval", type=float, default=0.5,
+                        help="seconds between checks for changes when "
+                        "inotify is not availible")
+    parser.add_argument("--worker", dest="workers", action="append",
+                        default=None, metavar="ADDRESS",
+                        help="run the test cases on the worker at this "
+                        "address, as started by 'python -m dectest worker'")
+    return parser
+
+def make_plan(collected, patterns, query=None):
+    """
+    Returns a list of ``(filename, suite_name, names)`` tuples, giving the
+    names of the test cases to run from each test suite in ``collected``, which
+    is a list in the format returned by :func:`collect`. Test cases must match
+    one of the glob ``patterns``, and the selection ``query`` if it is given.
+    Raises :class:`~dectest.registry.QueryError` for invalid queries.
+    """
+    queried = None
+    if query:
+        case_index = registry.InvertedIndex()
+        for filename, entry in collected:
+            for suite_entry in entry["suites"]:
+                for case in suite_entry["cases"]:
+                    key = (filename, suite_entry["name"], case["name"])
+                    case_index.add(key, registry.description_keys(case))
+        queried = case_index.select(query)
+
+    plan = []
+    for filename, entry in collected:
+        for suite_entry in entry["suites"]:
+            case_names = [case["name"] for case in suite_entry["cases"]]
+            names = select_names(suite_entry["name"], case_names, patterns)
+            if queried is not None:
+                names = set(name for name in names if
+                            (filename, suite_entry["name"], name) in queried)
+            if names:
+                plan.append((filename, suite_entry["name"], names))
+    return plan
+
+def run_plan(plan, maxfail=None, profile=False, workers=None):
+    """
+    Runs the test cases in ``plan``, as returned by :func:`make_plan`, and
+    returns the number of test cases that failed. If ``workers`` is given, the
+    test cases are run by the workers at those addresses.
+    """
+    fails = 0
+    for filename, suite_name, names in plan:
+        if maxfail and fails >= maxfail:
+            break
+
+        suite = load_suite(filename, suite_name)
+        if suite is None:
+            sys.stderr.write("Could not find test suite {0} in {1}\n".format(
+                    suite_name, filename))
+            fails += 1
+            continue
+
+        fails += suite.test(profile=profile,
+                            maxfail=maxfail - fails if maxfail else None,
+                            names=names, workers=workers) or 0
+    return fails
+
+def main(argv=None):
+    """
+    The entry point of the command line runner. Returns the exit status.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ["worker"]:
+        from . import distributed
+        return distributed.main(argv[1:])
+
+    args = make_parser().parse_args(argv)
+
+    if args.watch:
+        from . import watch
+        return watch.watch(args)
+
+    index = None
+    if args.use_index:
+        index = mindex.CollectionIndex(args.index)
+        index.prune()
+
+    collected = collect(args.paths, index, args.threads)
+    try:
+        plan = make_plan(collected, args.patterns, args.query)
+    except registry.QueryError as e:
+        sys.stderr.write(str(e) + "\n")
+        return 2
+
+    if index is not None:
+        index.save()
+
+    if args.list:
+        for filename, suite_name, names in plan:
+            for name in sorted(names):
+                print suite_name + "." + name
+        return 0
+
+    fails = run_plan(plan, args.maxfail, args.profile, args.workers)
+    return 1 if fails else 0
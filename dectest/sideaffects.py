@@ -3,16 +3,34 @@ This module contains various side affect tests that can be registered with a
 :class:`TestSuite`.
 """
 
+import copy
 import functools
+import random
+import types
 
-class SideAffectTest():
+from . import perf
+from . import profiling
+from . import strategies as mstrategies
+
+class SideAffectTest(object):
     """
     A base class for other side affect tests.
+    
+    The :class:`~dectest.suite.TestCase` that the side affect test belongs to
+    is availible as the ``testcase`` attribute, and can be used to call the
+    tested function again with :meth:`~dectest.suite.TestCase.call`.
+    
+    A side affect test is created for every test case that uses it, so the
+    built in tests declare ``__slots__`` to keep their per test case state
+    small. Subclasses that don't declare ``__slots__`` work as normal.
     """
+    __slots__ = ("_logger", "testcase", "instance")
     name = ""
     
     def __init__(self, logger):
         self._logger = logger
+        self.testcase = None
+        self.instance = None
     
     @property
     def needs_instance(self):
@@ -39,6 +57,14 @@ class SideAffectTest():
         """
         raise NotImplementedError()
     
+    def post_test(self):
+        """
+        Called after the test, even if the tested function raised an
+        exception and :meth:`test` was never called. An optional callback, for
+        cleaning up anything started in :meth:`pre_test`.
+        """
+        return
+    
     def decorator(self, *args, **kwargs):
         """
         Is the decorator that is accessed at the attribute with the same name
@@ -78,21 +104,27 @@ class GlobalStateChange(SideAffectTest):
     ...     globalvar = i
     ...
     """
+    __slots__ = ("func", "pre_call", "tests", "failed")
     name = "globalstatechange"
     
-    func = None
-    pre_call = {}
-    tests = {}
-    failed = False
+    def __init__(self, logger):
+        SideAffectTest.__init__(self, logger)
+        self.func = None
+        self.pre_call = {}
+        self.tests = {}
+        self.failed = False
     
     def pre_test(self):
         """
         Called before the tested function is called, so we use this to capture
         the global variables' state before the function is called.
         """
+        self.pre_call = {}
+        self.failed = False
         for varname in self.tests:
             if varname not in self.func.__globals__:
                 self.failed = True
+                break
             self.pre_call[varname] = self.func.__globals__[varname]
     
     def test(self):
@@ -155,9 +187,17 @@ class ClassStateChange(SideAffectTest):
     ...
     """
     
+    __slots__ = ("tests", "f_state", "s_state", "failed")
     name = "classstatechange"
     needs_instance = True
     
+    def __init__(self, logger):
+        SideAffectTest.__init__(self, logger)
+        self.tests = {}
+        self.f_state = {}
+        self.s_state = {}
+        self.failed = False
+    
     def decorator(self, tests):
         """
         Takes a dict of items that should be in the class' namespace, and
@@ -207,3 +247,475 @@ class ClassStateChange(SideAffectTest):
                     return False
         
         return True
+
+class Profile(SideAffectTest):
+    """
+    A side affect test that profiles the tested function. It always passes; the
+    profile is stored in the ``profiler`` attribute, and is merged into the
+    report printed by :meth:`~dectest.suite.TestSuite.test`.
+    
+    >>> ts = TestSuite("profiled suite", DictConfig({'testing':
+    ...     {'sideaffects': ['dectest.sideaffects.Profile']}}))
+    >>> @ts.register("tc")
+    ... @ts.tc.input(10000)
+    ... @ts.tc.profile()
+    ... def build(n):
+    ...     return [str(i) for i in range(n)]
+    ...
+    """
+    
+    __slots__ = ("interval", "profiler")
+    name = "profile"
+    
+    def decorator(self, interval=0.001):
+        """
+        Takes the interval, in seconds, at which the stack of the tested
+        function is sampled for the collapsed stack output. If ``interval`` is
+        ``None`` then the stack is not sampled.
+        """
+        self.interval = interval
+        self.profiler = None
+        
+        return self.blank_decorator
+    
+    def pre_test(self):
+        """
+        Starts profiling.
+        """
+        self.profiler = profiling.CaseProfiler(self.interval)
+        self.profiler.start()
+    
+    def test(self):
+        """
+        Stops profiling. Returns ``True``, as profiling can't fail a test case.
+        """
+        self.profiler.stop()
+        return True
+    
+    def post_test(self):
+        """
+        Stops profiling, if the tested function raised an exception before
+        :meth:`test` could.
+        """
+        if self.profiler is not None:
+            self.profiler.stop()
+
+class LoadTest(SideAffectTest):
+    """
+    A side affect test that drives the tested function with the input of the
+    test case from several threads and processes at once, and reports the
+    throughput, latency and scaling efficiency for each. A warning is logged if
+    the throughput falls as threads are added, which usually means the function
+    is contending for the GIL or a lock.
+    
+    >>> ts = TestSuite("load suite", DictConfig({'testing':
+    ...     {'sideaffects': ['dectest.sideaffects.LoadTest']}}))
+    >>> @ts.register("tc")
+    ... @ts.tc.input("a,b,c")
+    ... @ts.tc.out(["a", "b", "c"])
+    ... @ts.tc.loadtest(threads=[1, 2, 4], processes=[1, 4], duration=1)
+    ... def split(s):
+    ...     return s.split(",")
+    ...
+    """
+    
+    __slots__ = ("threads", "processes", "duration", "min_efficiency",
+                 "results")
+    name = "loadtest"
+    
+    def decorator(self, threads=(1, 2, 4, 8), processes=(1,), duration=2,
+                  min_efficiency=None):
+        """
+        Takes the numbers of ``threads`` and ``processes`` to drive the tested
+        function from, and the ``duration`` in seconds of each run. If
+        ``min_efficiency`` is given, the test fails if the scaling efficiency
+        of any run is below it.
+        """
+        self.threads = threads
+        self.processes = processes
+        self.duration = duration
+        self.min_efficiency = min_efficiency
+        self.results = []
+        
+        return self.blank_decorator
+    
+    def test(self):
+        """
+        Runs the load test, and stores the
+        :class:`~dectest.perf.LoadResult` objects in the ``results``
+        attribute.
+        """
+        try:
+            self.results = perf.load_test(self.testcase.call, self.threads,
+                                          self.processes, self.duration)
+        except perf.LoadError as e:
+            self._logger.warning("Load test of {0} failed: {1}".format(
+                    self.testcase.name, e))
+            return False
+        self._logger.info("Load test of {0}:\n{1}".format(
+                self.testcase.name, perf.format_load_results(self.results)))
+        
+        threaded = [r for r in self.results if r.kind == "threads"]
+        for previous, result in zip(threaded, threaded[1:]):
+            if result.throughput < previous.throughput:
+                self._logger.warning(
+                    "Throughput of {0} fell from {1:.1f} to {2:.1f} calls/s "
+                    "going from {3} to {4} threads, which suggests GIL or "
+                    "lock contention".format(
+                        self.testcase.name, previous.throughput,
+                        result.throughput, previous.workers, result.workers))
+                break
+        
+        if self.min_efficiency is not None:
+            for result in self.results:
+                if result.efficiency is not None and \
+                        result.efficiency < self.min_efficiency:
+                    return False
+        return True
+
+class ComparePerf(SideAffectTest):
+    """
+    A side affect test that compares the tested function against an older
+    implementation. Both are called with the input of the test case, and must
+    return equal outputs. They are then timed in interleaved rounds, and the
+    test fails unless the tested function is at least ``min_speedup`` times
+    faster, at the lower bound of the 95% confidence interval.
+    
+    >>> ts = TestSuite("compare suite", DictConfig({'testing':
+    ...     {'sideaffects': ['dectest.sideaffects.ComparePerf']}}))
+    >>> def old_total(values):
+    ...     total = 0
+    ...     for value in values:
+    ...         total += value
+    ...     return total
+    ...
+    >>> @ts.register("tc")
+    ... @ts.tc.input(range(1000))
+    ... @ts.tc.out(499500)
+    ... @ts.tc.compare_perf(old_total, min_speedup=1.2)
+    ... def total(values):
+    ...     return sum(values)
+    ...
+    """
+    
+    __slots__ = ("old_impl", "min_speedup", "rounds", "comparison")
+    name = "compare_perf"
+    
+    def decorator(self, old_impl, min_speedup=1.0, rounds=20):
+        """
+        Takes the old implementation, the speedup the tested function must
+        show over it, and the number of rounds of timing.
+        """
+        self.old_impl = old_impl
+        self.min_speedup = min_speedup
+        self.rounds = rounds
+        self.comparison = None
+        
+        return self.blank_decorator
+    
+    def test(self):
+        """
+        Checks that both implementations give the same output, then compares
+        their speed. The :class:`~dectest.perf.Comparison` is stored in the
+        ``comparison`` attribute.
+        """
+        testcase = self.testcase
+        new_output = testcase.call()
+        old_output = testcase.call(self.old_impl)
+        if new_output != old_output:
+            self._logger.warning(
+                "Test case {0} gave {1!r}, but the old implementation gave "
+                "{2!r}".format(testcase.name, new_output, old_output))
+            return False
+        
+        # Both sides are called in exactly the same way, so that neither pays
+        # for an extra frame or lookup the other doesn't
+        self.comparison = perf.compare(
+            functools.partial(testcase.call, self.old_impl),
+            functools.partial(testcase.call, testcase.get_function()),
+            self.rounds)
+        self._logger.info(
+            "Test case {0} is {1:.2f}x faster than the old implementation "
+            "(95% confidence interval {2:.2f}x - {3:.2f}x)".format(
+                testcase.name, self.comparison.speedup, self.comparison.low,
+                self.comparison.high))
+        return self.comparison.low >= self.min_speedup
+
+class Generate(SideAffectTest):
+    """
+    A side affect test that calls the tested function with many inputs drawn
+    from strategies in :mod:`dectest.strategies`, one strategy per positional
+    argument. Each output is checked by ``property``, if given, which is
+    called with the argument tuple and the output and should return ``True``
+    for a correct output, or else compared to ``reference`` called with the
+    same arguments. With neither, the only check is that the call does not
+    raise an exception; the output of the test case is never compared with
+    generated outputs, as it is only correct for the test case's own input. A
+    call that raises an exception always fails.
+    
+    A failing input is shrunk to a minimal counterexample, which is logged and
+    stored in the ``counterexample`` attribute.
+    
+    >>> ts = TestSuite("generated suite", DictConfig({'testing':
+    ...     {'sideaffects': ['dectest.sideaffects.Generate']}}))
+    >>> @ts.register("tc")
+    ... @ts.tc.input([3, 1, 2])
+    ... @ts.tc.out([1, 2, 3])
+    ... @ts.tc.generate(lists(integers()), reference=sorted, examples=10000)
+    ... def merge_sort(values):
+    ...     ...
+    """
+    
+    __slots__ = ("strategies", "examples", "property", "reference", "seed",
+                 "processes", "batch_size", "counterexample")
+    name = "generate"
+    
+    def decorator(self, *strategies, **options):
+        """
+        Takes the strategies for the arguments, and the keyword options
+        ``examples`` (10000), ``property``, ``reference``, ``seed``,
+        ``processes`` and ``batch_size`` (1000).
+        """
+        self.strategies = strategies
+        self.examples = options.get("examples", 10000)
+        self.property = options.get("property")
+        self.reference = options.get("reference")
+        self.seed = options.get("seed")
+        self.processes = options.get("processes")
+        self.batch_size = options.get("batch_size", 1000)
+        self.counterexample = None
+        
+        return self.blank_decorator
+    
+    def check(self, args):
+        """
+        Returns ``True`` if the tested function gives a correct output for the
+        argument tuple ``args``.
+        """
+        try:
+            output = self.testcase.call(args=args)
+            if self.property is not None:
+                return bool(self.property(args, output))
+            if self.reference is not None:
+                return output == self.reference(*args)
+            return True
+        except Exception:
+            return False
+    
+    def test(self):
+        """
+        Searches for, and shrinks, a failing input.
+        """
+        self.counterexample = None
+        failure = mstrategies.search(self.check, self.strategies,
+                                     self.examples, self.seed,
+                                     self.batch_size, self.processes)
+        if failure is None:
+            return True
+        
+        self.counterexample = mstrategies.minimize(self.check,
+                                                   self.strategies, failure)
+        self._logger.warning("Test case {0} failed with the input {1!r}".format(
+                self.testcase.name, self.counterexample))
+        return False
+
+def _snapshot(value):
+    """
+    Returns a deep copy of ``value`` to compare it with later, or ``None`` if
+    it can't be copied, or if the copy is not equal to it, as with objects that
+    compare by identity.
+    """
+    try:
+        snapshot = copy.deepcopy(value)
+        if snapshot == value:
+            return (snapshot,)
+    except Exception:
+        pass
+
+class Pure(SideAffectTest):
+    """
+    A side affect test that checks that the tested function is pure: that it
+    returns equal outputs when called again with the same input, and that it
+    does not change it's arguments, the global variables it uses or the
+    variables watched by :class:`GlobalStateChange`, or the state of the
+    instance it is called on. If the test case also uses :class:`Generate`,
+    then the function is checked in the same way with ``examples`` inputs drawn
+    from it's strategies.
+    
+    Values that don't compare equal to a copy of themselves can only be
+    checked for being replaced, not for being changed, and state hidden inside
+    objects, such as that of a random number generator, can't be seen at all.
+    
+    If ``memoize`` is true, and every test case of the function uses this side
+    affect test and passes, the function is wrapped in a
+    :class:`~dectest.memoize.MemoCache` of at most ``maxsize`` results, each
+    kept for at most ``ttl`` seconds. Methods are never memoised, as their
+    results may depend on state that other methods change. Results that can be
+    changed, such as lists, are copied each time they are returned from the
+    cache, which costs time in proportion to their size.
+    
+    >>> ts = TestSuite("pure suite", DictConfig({'testing':
+    ...     {'sideaffects': ['dectest.sideaffects.Pure']}}))
+    >>> @ts.register("tc")
+    ... @ts.tc.input(10)
+    ... @ts.tc.out(55)
+    ... @ts.tc.pure(memoize=True, maxsize=1024)
+    ... def fib(n):
+    ...     ...
+    """
+    
+    __slots__ = ("func", "calls", "examples", "memoize", "maxsize", "ttl",
+                 "verified", "_args", "_globals", "_state")
+    name = "pure"
+    
+    def __init__(self, logger):
+        SideAffectTest.__init__(self, logger)
+        self.func = None
+        self.calls = 2
+        self.examples = 100
+        self.memoize = False
+        self.maxsize = 128
+        self.ttl = None
+        self.verified = False
+        self._args = None
+        self._globals = {}
+        self._state = None
+    
+    @property
+    def needs_instance(self):
+        """
+        The instance is only needed when the tested function is a method.
+        """
+        return self.testcase is not None and self.testcase.is_method()
+    
+    def decorator(self, calls=2, examples=100, memoize=False, maxsize=128,
+                  ttl=None):
+        """
+        Takes the number of extra ``calls`` made with the input of the test
+        case, the number of generated ``examples``, and the memoisation
+        options.
+        """
+        self.calls = calls
+        self.examples = examples
+        self.memoize = memoize
+        self.maxsize = maxsize
+        self.ttl = ttl
+        
+        def dec(func):
+            """
+            Get the function, so as to find the global variables it uses.
+            """
+            self.func = func
+            return func
+        
+        return dec
+    
+    def pre_test(self):
+        """
+        Takes snapshots of the input, the global variables and the instance
+        state before the tested function is called.
+        """
+        self.verified = False
+        self._args = _snapshot(self.testcase.get_input())
+        self._globals = self._snapshot_globals()
+        self._state = None
+        if self.instance is not None and hasattr(self.instance, "__dict__"):
+            self._state = _snapshot(vars(self.instance))
+    
+    def test(self):
+        """
+        Checks that the call made by the test case changed nothing, then calls
+        the function again to check that it gives the same output.
+        """
+        name = self.testcase.name
+        args, kwargs = self.testcase.get_input()
+        
+        if self._args is not None and self._args[0] != (args, kwargs):
+            return self._fail("changed it's arguments")
+        if not self._unchanged():
+            return False
+        
+        inputs = [(args, kwargs)]
+        generate = self.testcase.get_sideaffect(Generate)
+        if generate is not None and self.examples:
+            rnd = random.Random(0)
+            inputs.extend((tuple(strategy.draw(rnd) for strategy in
+                                 generate.strategies), {})
+                          for i in range(self.examples))
+        
+        for args, kwargs in inputs:
+            before = _snapshot((args, kwargs))
+            self._globals = self._snapshot_globals()
+            try:
+                outputs = [self.testcase.call(args=copy.deepcopy(args),
+                                              kwargs=copy.deepcopy(kwargs))
+                           for i in range(self.calls + 1)]
+                output = self.testcase.call(args=args, kwargs=kwargs)
+            except Exception as e:
+                return self._fail("raised {0!r} with the input {1!r}".format(
+                        e, args))
+            
+            if any(other != outputs[0] for other in outputs + [output]):
+                return self._fail("gave different outputs for the input "
+                                  "{0!r}".format(args))
+            if before is not None and before[0] != (args, kwargs):
+                return self._fail("changed the arguments {0!r}".format(
+                        before[0][0]))
+            if not self._unchanged():
+                return False
+        
+        self.verified = True
+        return True
+    
+    def _snapshot_globals(self):
+        """
+        Returns a dict mapping the names of the global variables used by the
+        function, and those watched by :class:`GlobalStateChange`, to their
+        value and a snapshot of it.
+        """
+        if self.func is None:
+            return {}
+        
+        names = set(self.func.__code__.co_names)
+        watched = self.testcase.get_sideaffect(GlobalStateChange)
+        if watched is not None:
+            names.update(watched.tests)
+        
+        namespace = self.func.__globals__
+        snapshots = {}
+        for name in names:
+            if name not in namespace:
+                continue
+            value = namespace[name]
+            if isinstance(value, (types.ModuleType, types.FunctionType,
+                                  types.BuiltinFunctionType, type,
+                                  types.ClassType)):
+                snapshots[name] = (value, None)
+            else:
+                snapshots[name] = (value, _snapshot(value))
+        return snapshots
+    
+    def _unchanged(self):
+        """
+        Returns ``True`` if the global variables and the instance state match
+        their snapshots, otherwise logs what changed and returns ``False``.
+        """
+        namespace = self.func.__globals__ if self.func is not None else {}
+        for name, (value, snapshot) in self._globals.items():
+            if namespace.get(name) is not value:
+                return self._fail("replaced the global {0}".format(name))
+            if snapshot is not None and snapshot[0] != value:
+                return self._fail("changed the global {0}".format(name))
+        
+        if self._state is not None and self._state[0] != vars(self.instance):
+            return self._fail("changed the state of {0!r}".format(
+                    self.instance))
+        return True
+    
+    def _fail(self, reason):
+        """
+        Logs why the function is not pure, and returns ``False``.
+        """
+        self._logger.warning("Test case {0} is not pure: the function {1}"
+                             .format(self.testcase.name, reason))
+        return False
@@ -0,0 +1,343 @@
+"""
+Strategies for generating random inputs, used by the
+:class:`~dectest.sideaffects.Generate` side affect test. A strategy can draw a
+random value, and can suggest simpler versions of a value, so that a failing
+input can be shrunk to a minimal counterexample.
+
+Strategies are built by combining the functions in this module::
+
+    pairs = tuples(integers(0, 100), text(max_size=10))
+    names = lists(sampled_from(["a", "b", "c"]), max_size=5)
+"""
+
+import multiprocessing
+import random
+import string
+
+class Strategy():
+    """
+    The base class of strategies.
+    """
+
+    def draw(self, rnd):
+        """
+        Returns a random value, using the :class:`random.Random` ``rnd``.
+        """
+        raise NotImplementedError()
+
+    def shrink(self, value):
+        """
+        Yields values that are simpler than ``value``, simplest first.
+        """
+        return iter(())
+
+class Integers(Strategy):
+    """
+    Integers between ``low`` and ``high`` inclusive, shrinking towards zero or
+    whichever bound is closest to it.
+    """
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+        self.target = min(max(0, low), high)
+
+    def draw(self, rnd):
+        # Favour the bounds and the target, where bugs tend to be
+        if rnd.random() < 0.1:
+            return rnd.choice((self.low, self.high, self.target))
+        return rnd.randint(self.low, self.high)
+
+    def shrink(self, value):
+        target = self.target
+        if value == target:
+            return
+        yield target
+        delta = (value - target) // 2
+        while delta:
+            yield value - delta
+            delta = int(delta / 2.0)
+        yield value - 1 if value > target else value + 1
+
+class Floats(Strategy):
+    """
+    Floats between ``low`` and ``high``, shrinking towards the integers and
+    towards zero or whichever bound is closest to it.
+    """
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+        self.target = min(max(0.0, low), high)
+
+    def draw(self, rnd):
+        return rnd.uniform(self.low, self.high)
+
+    def shrink(self, value):
+        if value == self.target:
+            return
+        yield self.target
+        rounded = float(int(value))
+        if rounded != value and self.low <= rounded <= self.high:
+            yield rounded
+        yield self.target + (value - self.target) / 2
+
+class Just(Strategy):
+    """
+    Always the value ``value``.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def draw(self, rnd):
+        return self.value
+
+class SampledFrom(Strategy):
+    """
+    One of ``values``, shrinking towards the earlier values.
+    """
+
+    def __init__(self, values):
+        self.values = list(values)
+
+    def draw(self, rnd):
+        return rnd.choice(self.values)
+
+    def shrink(self, value):
+        for candidate in self.values:
+            if candidate == value:
+                return
+            yield candidate
+
+class OneOf(Strategy):
+    """
+    A value from one of ``strategies``. Values are shrunk by every strategy
+    that might have drawn them, which may suggest values another strategy
+    could not have drawn.
+    """
+
+    def __init__(self, strategies):
+        self.strategies = strategies
+
+    def draw(self, rnd):
+        return rnd.choice(self.strategies).draw(rnd)
+
+    def shrink(self, value):
+        for strategy in self.strategies:
+            try:
+                for candidate in strategy.shrink(value):
+                    yield candidate
+            except (TypeError, ValueError):
+                continue
+
+class Lists(Strategy):
+    """
+    Lists of up to ``max_size`` values drawn from ``elements``. Lists are
+    shrunk by removing elements, then by shrinking each element.
+    """
+
+    def __init__(self, elements, min_size=0, max_size=10):
+        self.elements = elements
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def draw(self, rnd):
+        size = rnd.randint(self.min_size, self.max_size)
+        draw = self.elements.draw
+        return [draw(rnd) for i in range(size)]
+
+    def shrink(self, value):
+        size = len(value)
+        # Remove halves, then quarters, and so on down to single elements
+        chunk = size // 2 or 1
+        while chunk:
+            for start in range(0, size, chunk):
+                if size - chunk >= self.min_size:
+                    yield value[:start] + value[start + chunk:]
+            chunk //= 2
+        for i, element in enumerate(value):
+            for candidate in self.elements.shrink(element):
+                yield value[:i] + [candidate] + value[i + 1:]
+
+class Text(Strategy):
+    """
+    Strings of up to ``max_size`` characters from ``alphabet``, shrunk in the
+    same way as :class:`Lists`.
+    """
+
+    def __init__(self, alphabet, min_size=0, max_size=10):
+        self.chars = Lists(SampledFrom(alphabet), min_size, max_size)
+
+    def draw(self, rnd):
+        return "".join(self.chars.draw(rnd))
+
+    def shrink(self, value):
+        for candidate in self.chars.shrink(list(value)):
+            yield "".join(candidate)
+
+class Tuples(Strategy):
+    """
+    Tuples with a value drawn from each of ``strategies``.
+    """
+
+    def __init__(self, strategies):
+        self.strategies = strategies
+
+    def draw(self, rnd):
+        return tuple(strategy.draw(rnd) for strategy in self.strategies)
+
+    def shrink(self, value):
+        for i, strategy in enumerate(self.strategies):
+            for candidate in strategy.shrink(value[i]):
+                yield value[:i] + (candidate,) + value[i + 1:]
+
+def integers(low=-2 ** 31, high=2 ** 31 - 1):
+    """
+    Returns a strategy for integers between ``low`` and ``high`` inclusive.
+    """
+    return Integers(low, high)
+
+def floats(low=-1e9, high=1e9):
+    """
+    Returns a strategy for floats between ``low`` and ``high``.
+    """
+    return Floats(low, high)
+
+def booleans():
+    """
+    Returns a strategy for booleans, shrinking towards ``False``.
+    """
+    return SampledFrom([False, True])
+
+def just(value):
+    """
+    Returns a strategy that always gives ``value``.
+    """
+    return Just(value)
+
+def sampled_from(values):
+    """
+    Returns a strategy for choosing one of ``values``.
+    """
+    return SampledFrom(values)
+
+def one_of(*strategies):
+    """
+    Returns a strategy that draws from one of ``strategies``.
+    """
+    return OneOf(strategies)
+
+def lists(elements, min_size=0, max_size=10):
+    """
+    Returns a strategy for lists of values from the strategy ``elements``.
+    """
+    return Lists(elements, min_size, max_size)
+
+def text(alphabet=string.ascii_letters + string.digits, min_size=0,
+         max_size=10):
+    """
+    Returns a strategy for strings of characters from ``alphabet``.
+    """
+    return Text(alphabet, min_size, max_size)
+
+def tuples(*strategies):
+    """
+    Returns a strategy for tuples with a value from each of ``strategies``.
+    """
+    return Tuples(strategies)
+
+def _draw_batch(strategies, rnd, size):
+    """
+    Returns a list of ``size`` argument tuples drawn from ``strategies``.
+    """
+    draws = [strategy.draw for strategy in strategies]
+    return [tuple(draw(rnd) for draw in draws) for i in range(size)]
+
+def _search_batch(check, strategies, seed, batch, size):
+    """
+    Draws and checks a batch of examples. Returns the index in the batch of the
+    first example that fails, or ``None``.
+    """
+    rnd = random.Random(seed * 1000003 + batch)
+    for i, args in enumerate(_draw_batch(strategies, rnd, size)):
+        if not check(args):
+            return i
+
+# The check and strategies of the search running in a process pool, inherited
+# by the forked workers so that they don't have to be pickled.
+_pool_search = None
+
+def _pool_batch(task):
+    """
+    Runs a batch of the search in a pool worker.
+    """
+    check, strategies = _pool_search
+    seed, batch, size = task
+    return batch, _search_batch(check, strategies, seed, batch, size)
+
+def search(check, strategies, examples=10000, seed=None, batch_size=1000,
+           processes=None):
+    """
+    Draws up to ``examples`` argument tuples from ``strategies`` and calls
+    ``check`` with each, in batches of ``batch_size``. Returns the first tuple
+    for which ``check`` returns ``False``, or ``None`` if every example passes.
+
+    Each batch is drawn from it's own seeded random number generator, so the
+    batches can be spread over ``processes`` forked worker processes and any
+    failing example drawn again in this process.
+    """
+    global _pool_search
+
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    tasks = [(seed, batch, min(batch_size, examples - start))
+             for batch, start in enumerate(range(0, examples, batch_size))]
+
+    if processes and processes > 1:
+        _pool_search = check, strategies
+        pool = multiprocessing.Pool(processes)
+        try:
+            failures = [(batch, index) for batch, index in
+                        pool.imap_unordered(_pool_batch, tasks)
+                        if index is not None]
+        finally:
+            pool.terminate()
+            _pool_search = None
+        if not failures:
+            return
+        batch, index = min(failures)
+    else:
+        for seed, batch, size in tasks:
+            index = _search_batch(check, strategies, seed, batch, size)
+            if index is not None:
+                break
+        else:
+            return
+
+    rnd = random.Random(seed * 1000003 + batch)
+    return _draw_batch(strategies, rnd, index + 1)[index]
+
+def minimize(check, strategies, args, max_attempts=10000):
+    """
+    Shrinks the failing argument tuple ``args`` by repeatedly replacing an
+    argument with a simpler value suggested by it's strategy, as long as
+    ``check`` still fails. Returns the simplest failing tuple found.
+    """
+    attempts = 0
+    improved = True
+    while improved and attempts < max_attempts:
+        improved = False
+        for i, strategy in enumerate(strategies):
+            for candidate in strategy.shrink(args[i]):
+                attempts += 1
+                new_args = args[:i] + (candidate,) + args[i + 1:]
+                if not check(new_args):
+                    args = new_args
+                    improved = True
+                    break
+                if attempts >= max_attempts:
+                    break
+            if improved:
+                break
+    return args
@@ -2,11 +2,86 @@
 The main test suite class, :class:`TestSuite` is found in this module.
 """
 
+import collections
 import functools
 import logging
+import multiprocessing
+import Queue
+import signal
 import sys
+import threading
 
 from . import config as mconfig
+from . import coverage as mcoverage
+from . import history as mhistory
+from . import memoize
+from . import metrics
+from . import perf
+from . import profiling
+from . import registry
+from . import sideaffects
+
+CaseContext = collections.namedtuple(
+    "CaseContext", ["config", "logger", "sideaffects", "inputs"])
+
+NO_INPUT = ((), {})
+
+_tag_sets = {}
+
+def typed_key(value):
+    """
+    Returns a key for ``value`` that includes the type of it, and of anything
+    in it if it is a tuple or a frozenset, so that values that are equal but of
+    different types, such as ``1``, ``1.0`` and ``True``, have different keys.
+    """
+    if isinstance(value, tuple):
+        return (type(value), tuple(typed_key(item) for item in value))
+    if isinstance(value, frozenset):
+        return (type(value), frozenset(typed_key(item) for item in value))
+    return (type(value), value)
+
+def intern_input(args, kwargs, inputs):
+    """
+    Returns an ``(args, kwargs)`` pair equal to the given one, reusing the pair
+    from an earlier test case with the same input if there is one in the dict
+    ``inputs``. Inputs are only shared if they have the same types. Inputs that
+    are not hashable are returned as they are.
+    """
+    if not args and not kwargs:
+        return NO_INPUT
+    try:
+        key = typed_key((args, tuple(sorted(kwargs.items()))))
+        return inputs.setdefault(key, (args, kwargs))
+    except TypeError:
+        return args, kwargs
+
+def intern_tags(tags):
+    """
+    Returns a frozenset of ``tags``, shared with every other test case with
+    the same tags.
+    """
+    tags = frozenset(tags)
+    return _tag_sets.setdefault(tags, tags)
+
+def safe_repr(value):
+    """
+    Returns the ``repr`` of ``value``, or a placeholder naming it's type if
+    the ``repr`` raises an exception.
+    """
+    try:
+        return repr(value)
+    except Exception:
+        return "<unprintable {0}>".format(type(value).__name__)
+
+Readiness = collections.namedtuple(
+    "Readiness", ["ready", "passed", "failed", "timed_out", "skipped",
+                  "elapsed"])
+
+class TestTimeout(Exception):
+    """
+    Raised inside a tested function when it has run for longer than the
+    timeout of its test case.
+    """
 
 class TestSuite():
     """
@@ -15,8 +90,6 @@ class TestSuite():
     for detailing any tests created.
     """
     
-    _sideaffect_tests = {}
-    
     def __init__(self, name, config=None, logger=None):
         """
         Initialises the test suite, mainly populating some hidden attributes.
@@ -33,6 +106,11 @@ class TestSuite():
         
         self._testcases = {}
         self._tests = {}
+        self._caches = {}
+        self._sideaffect_tests = {}
+        self._index = registry.InvertedIndex()
+        self._case_context = CaseContext(config, logger,
+                                         self._sideaffect_tests, {})
         
         for name in self._config.get_list('testing', 'sideaffects') or []:
             sat = self._config.get_python(name)
@@ -45,36 +123,119 @@ class TestSuite():
         
         self._run_tests = self._config.get_bool('testing', 'runtests') or \
             self._config.get_default('testing', 'runtests')
+        self._metrics = self._config.get_bool('metrics', 'enabled')
+        self._overhead = self._metrics and \
+            self._config.get_bool('metrics', 'overhead')
+        self._coverage = None
+        
+        registry.REGISTRY.add_suite(self)
     
-    def test(self):
+    def test(self, profile=False, maxfail=None, names=None, coverage=False,
+             workers=None):
         """
-        Runs all the test cases.
+        Runs all the test cases, or only those named in ``names`` if it is
+        given. Returns the number of test cases that failed.
+        
+        If ``profile`` is ``True``, then each test case is profiled, and a
+        report of the functions that the test cases spent the most time in is
+        printed after the results. See the ``profiling`` config section for
+        how to save the individual profiles and the collapsed stacks.
+        
+        If ``maxfail`` is given, then no more test cases are run once that many
+        have failed. It defaults to the ``testing.maxfail`` config value.
+        
+        If ``coverage`` is ``True``, then the lines each test case executes in
+        the files of the tested functions are recorded, and a summary is
+        printed after the results. The per test case coverage is availible from
+        :meth:`get_coverage` afterwards.
+        
+        If the ``history.file`` config value is set, then the tested function
+        of each test case that passes is timed, and test cases that have
+        become slower than in earlier runs are reported. See
+        :mod:`dectest.history`.
+        
+        If ``workers`` is given, as a list of worker addresses, then the test
+        cases are run by those workers rather than in this process, as
+        described in :mod:`dectest.distributed`. It defaults to the
+        ``distributed.workers`` config value. Test cases run by workers are not
+        profiled, and their coverage is not collected.
         """
         if not self._run_tests:
-            return
+            return 0
+        
+        if maxfail is None:
+            maxfail = self._config.get("testing", "maxfail")
+        if workers is None:
+            workers = self._config.get_list("distributed", "workers")
+        
+        remote = None
+        if workers:
+            remote = self._run_remote(workers, names, maxfail)
+        
+        history_file = self._config.get("history", "file")
+        repeats = self._config.get("history", "repeats")
+        batch_time = self._config.get("history", "batchtime")
+        timings = {}
+        
+        report = profiling.ProfileReport()
+        interval = self._config.get("profiling", "interval")
+        
+        collector = None
+        if coverage:
+            collector = mcoverage.CoverageCollector(self._tested_files())
+            self._coverage = mcoverage.CoverageReport()
         
         print "Test Suite '{0}'".format(self._name)
         print "=" * 80
         fails = 0
-        for name, tc in self._future_tests.iteritems():
-            for test in tc["sideaffects"]:
-                test.pre_test()
-            
-            args, kwargs = tc["input"]
-            output = tc["func"](*args, **kwargs)
+        skipped = 0
+        for name, tc in sorted(self._testcases.iteritems()):
+            if names is not None and name not in names:
+                continue
+            if remote is not None:
+                if name not in remote:
+                    skipped += 1
+                    continue
+                passed = remote[name]
+                sys.stdout.write('.' if passed else 'f')
+                fails += not passed
+                continue
+            if maxfail and fails >= maxfail:
+                skipped += 1
+                continue
             
-            failed = False
-            failed = failed or not output == tc["output"]
+            profiler = None
+            if profile and not tc.get_sideaffect(sideaffects.Profile):
+                profiler = profiling.CaseProfiler(interval)
             
-            for test in tc["sideaffects"]:
-                failed = failed or not test.test()
+            if collector is not None:
+                collector.start()
+                try:
+                    passed = self._run_case(tc, profiler)
+                finally:
+                    collector.stop()
+                self._coverage.add(name, collector.bitmaps)
+            else:
+                passed = self._run_case(tc, profiler)
             
-            if failed:
+            if passed:
+                sys.stdout.write('.')
+                if history_file:
+                    durations = tc.time(repeats, batch_time)
+                    if durations:
+                        timings[name] = durations
+            else:
                 sys.stdout.write('f')
                 fails += 1
-            else:
-                sys.stdout.write('.')
+            
+            report.add(name, tc.get_profiler())
         print "\n",
+        
+        regressions = []
+        if history_file:
+            regressions = self._check_history(history_file, timings,
+                                              record=names is None)
+            fails += sum(1 for regression in regressions if regression.failed)
         print "=" * 80
         if fails == 0:
             print "All tests passed successfully"
@@ -83,13 +244,149 @@ class TestSuite():
                 print "1 test failed"
             else:
                 print "{0} tests failed".format(fails)
+        if skipped:
+            print "{0} tests were not run after {1} failures".format(
+                skipped, fails)
+        
+        if regressions:
+            print "Performance regressions in '{0}'".format(self._name)
+            print "=" * 80
+            mhistory.print_regressions(regressions)
+        
+        if report.profilers:
+            self._report_profile(report)
+        
+        if collector is not None:
+            print "Coverage of '{0}'".format(self._name)
+            print "=" * 80
+            self._coverage.print_summary()
+        
+        if self._metrics:
+            metrics.METRICS.flush()
+        
+        return fails
+    
+    def _run_remote(self, workers, names, maxfail):
+        """
+        Runs the test cases on the ``workers``, and returns a dict mapping the
+        name of each test case that was run to ``True`` if it passed.
+        """
+        from . import distributed
+        
+        coordinator = distributed.Coordinator(
+            workers,
+            batch_size=self._config.get("distributed", "batchsize"),
+            timeout=self._config.get("distributed", "timeout"),
+            attempts=self._config.get("distributed", "attempts"),
+            logger=self._logger)
+        cases = [distributed.case_key(self, tc) for name, tc in
+                 sorted(self._testcases.iteritems())
+                 if names is None or name in names]
+        results = coordinator.run(cases, maxfail)
+        return dict((case_name, passed) for
+                    (filename, suite_name, case_name), passed in
+                    results.iteritems())
+    
+    def _check_history(self, filename, timings, record=True):
+        """
+        Compares ``timings`` with the history in ``filename``, then records
+        them there if ``record`` is ``True`` and there are any. Returns the list
+        of regressions found.
+        """
+        history = mhistory.History(filename)
+        machine = mhistory.machine_fingerprint()
+        baseline = history.baseline(self._name, machine,
+                                    self._config.get("history", "window"))
+        regressions = mhistory.compare(
+            baseline, timings,
+            alpha=self._config.get("history", "alpha"),
+            threshold=self._config.get("history", "threshold"))
+        
+        if not record or not timings:
+            return regressions
+        try:
+            history.append(self._name, timings, mhistory.git_revision(),
+                           machine)
+        except IOError as e:
+            self._logger.warning("Could not record timings in {0}: {1}".format(
+                    filename, e))
+        return regressions
+    
+    def get_coverage(self):
+        """
+        Returns the :class:`~dectest.coverage.CoverageReport` from the last
+        call to :meth:`test` with ``coverage=True``, or ``None``.
+        """
+        return self._coverage
     
-    def register(self, name, method=False):
+    def _tested_files(self):
+        """
+        Returns the set of files that the tested functions are defined in.
+        """
+        return set(func.__code__.co_filename for func in self._tests
+                   if hasattr(func, "__code__"))
+    
+    def select(self, query):
+        """
+        Returns the set of names of the test cases matching the selection query
+        ``query``, which can be passed to :meth:`test`. A query is made up of
+        tags, ``module:<name>`` and ``function:<name>`` terms, combined with
+        ``and``, ``or``, ``not`` and brackets. For example::
+        
+            ts.test(names=ts.select("fast and not (db or network)"))
+        """
+        return self._index.select(query)
+    
+    @property
+    def name(self):
+        """
+        The name of the test suite.
+        """
+        return self._name
+    
+    def get_testcases(self):
+        """
+        Returns a dict mapping the names of the registered test cases to the
+        :class:`TestCase` objects.
+        """
+        return dict(self._testcases)
+    
+    def unregister(self):
+        """
+        Removes the test suite, and all of it's test cases, from the global
+        :data:`~dectest.registry.REGISTRY`. Every test suite is registered when
+        it is created, and the registry keeps it alive untill this is called,
+        so a test suite that is thrown away must be unregistered before it can
+        be garbage collected.
+        """
+        registry.REGISTRY.remove_suite(self)
+    
+    def _report_profile(self, report):
+        """
+        Prints the hotspot report of the profiled test cases, and saves the
+        profiles as requested by the ``profiling`` config section.
+        """
+        print "Profile of '{0}'".format(self._name)
+        print "=" * 80
+        report.print_hotspots(limit=self._config.get("profiling", "limit"))
+        
+        statsdir = self._config.get("profiling", "statsdir")
+        if statsdir:
+            report.dump(statsdir)
+        
+        collapsed = self._config.get("profiling", "collapsed")
+        if collapsed:
+            report.write_collapsed(collapsed)
+    
+    def register(self, name, method=False, tags=()):
         """
         Creates a new test case, with the given name. The :class:`TestCase`
         object will be availible as an attribute of the :class:`TestSuite` with
         the same name as the new test case.
         
+        The test case is indexed under each of the strings in ``tags``, so that
+        it can be selected with :meth:`select`.
+        
         >>> ts = TestSuite()
         >>> @ts.register("tc")
         ... def test():
@@ -108,8 +405,7 @@ class TestSuite():
             self._logger.warning("Cannot register the same test case twice.")
             return self._blank_decorator
         
-        tc = TestCase(self._config, self._logger, 
-                      self._sideaffect_tests, method, name)
+        tc = TestCase(self._case_context, method, name, tags)
         
         def decorator(func):
             """
@@ -124,6 +420,8 @@ class TestSuite():
                 actuall_func.tested = False
             
             tc.set_func(actuall_func)
+            self._index.add(name, registry.case_keys(tc))
+            registry.REGISTRY.add_case(self, tc)
             
             if not actuall_func in self._tests:
                 self._tests[actuall_func] = [tc]
@@ -132,6 +430,9 @@ class TestSuite():
             
             @functools.wraps(func)
             def test_dec(*args, **kwargs):
+                if self._overhead:
+                    start = perf.clock()
+                
                 if not actuall_func.tested and self._run_tests and \
                         self._config.get_bool("testing", "testasrun"):
 
@@ -144,6 +445,12 @@ class TestSuite():
                     
                     actuall_func.tested = True
                 
+                if self._overhead:
+                    metrics.record_overhead(self._name, perf.clock() - start)
+                
+                cache = self._caches.get(actuall_func)
+                if cache is not None:
+                    return cache.call(func, args, kwargs)
                 return func(*args, **kwargs)
             test_dec._original_function = actuall_func
             
@@ -158,9 +465,198 @@ class TestSuite():
         """
         testcases = self._tests[func]
         
+        passed = True
         for tc in testcases:
-            out = tc.test()
+            out = self._run_case(tc)
             self._log_result(tc.name, out)
+            passed = out and passed
+        
+        if passed:
+            self._memoize(func)
+    
+    @staticmethod
+    def verify_all(workers=None, deadline=None, suites=None):
+        """
+        Runs the test cases of every function registered with every test
+        suite, or with the given ``suites``, in a pool of ``workers`` threads,
+        and marks the functions as tested so that they are not tested again
+        when they are first called. This is meant to be run once as a service
+        starts, before it accepts requests, rather than testing each function
+        on it's first call.
+        
+        If ``deadline`` is given, no more test cases are started once that
+        many seconds have passed, and the test cases of the functions not
+        tested in time are reported as timed out. Those functions are not
+        marked as tested or memoised, even if a test case that was still
+        running at the deadline finishes later. Raises ``ValueError`` if
+        ``workers`` is less than one.
+        
+        The workers are threads, so ``testing.timeout`` and
+        :meth:`TestCase.timeout` are silently ignored by the test cases they
+        run.
+        
+        Functions that have already been tested, and methods that have not
+        been called yet, so have no value for ``self``, are skipped, as are
+        the functions of suites that don't run tests.
+        
+        Returns a :data:`Readiness` tuple. ``ready`` is ``True`` if no test
+        case failed or timed out; ``passed``, ``failed``, ``timed_out`` and
+        ``skipped`` are lists of test case names, each prefixed by the name of
+        it's suite and a ``.``; and ``elapsed`` is the number of seconds taken.
+        
+        >>> readiness = TestSuite.verify_all(workers=8, deadline=30)
+        >>> if not readiness.ready:
+        ...     sys.exit(1)
+        """
+        start = perf.clock()
+        if suites is None:
+            suites = list(registry.REGISTRY.suites)
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        if workers <= 0:
+            raise ValueError("verify_all needs at least one worker, not "
+                             "{0!r}".format(workers))
+        
+        jobs = []
+        skipped = []
+        for suite in suites:
+            for func, testcases in suite._tests.items():
+                if not suite._run_tests or getattr(func, "tested", False) or \
+                        any(tc.needs_self() for tc in testcases):
+                    skipped.extend(suite._name + "." + tc.name
+                                   for tc in testcases)
+                else:
+                    jobs.append((suite, func))
+        
+        queue = Queue.Queue()
+        for job in jobs:
+            queue.put(job)
+        results = {}
+        lock = threading.Lock()
+        # Set, with the lock held, once the result has been built, after which
+        # late workers must not change anything
+        closed = []
+        
+        def expired():
+            return deadline is not None and perf.clock() - start >= deadline
+        
+        def work():
+            while not expired():
+                try:
+                    suite, func = queue.get_nowait()
+                except Queue.Empty:
+                    return
+                outcomes = suite._verify_function(func, expired)
+                with lock:
+                    if closed or outcomes is None:
+                        return
+                    results[(suite, func)] = outcomes
+                    func.tested = True
+                    if all(passed for name, passed in outcomes):
+                        suite._memoize(func)
+        
+        threads = [threading.Thread(target=work)
+                   for i in range(min(workers, len(jobs)))]
+        for thread in threads:
+            # Test cases still running at the deadline are left behind
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            if deadline is None:
+                thread.join()
+            else:
+                thread.join(max(deadline - (perf.clock() - start), 0))
+        
+        passed, failed, timed_out = [], [], []
+        with lock:
+            closed.append(True)
+            for suite, func in jobs:
+                outcomes = results.get((suite, func))
+                if outcomes is None:
+                    timed_out.extend(suite._name + "." + tc.name
+                                     for tc in suite._tests[func])
+                    continue
+                for name, out in outcomes:
+                    (passed if out else failed).append(suite._name + "." +
+                                                       name)
+        
+        metrics.METRICS.flush()
+        return Readiness(not failed and not timed_out, sorted(passed),
+                         sorted(failed), sorted(timed_out), sorted(skipped),
+                         perf.clock() - start)
+    
+    def _verify_function(self, func, expired):
+        """
+        Runs the test cases of ``func`` for :meth:`verify_all`. Returns a list
+        of ``(name, passed)`` tuples, or ``None`` if ``expired()`` became true
+        before every test case was run.
+        """
+        outcomes = []
+        for tc in self._tests[func]:
+            if expired():
+                return None
+            try:
+                passed = self._run_case(tc)
+            except Exception as e:
+                self._logger.warning("Test case {0} raised {1!r}".format(
+                        tc.name, e))
+                passed = False
+            if not passed:
+                self._logger.warning("Test case {0} failed".format(tc.name))
+            outcomes.append((tc.name, passed))
+        return outcomes
+    
+    def _memoize(self, func):
+        """
+        Installs a :class:`~dectest.memoize.MemoCache` for ``func`` if it's
+        test cases ask for it with the :class:`~dectest.sideaffects.Pure` side
+        affect test, and every one of them has shown it to be pure.
+        """
+        testcases = self._tests[func]
+        pures = [tc.get_sideaffect(sideaffects.Pure) for tc in testcases]
+        if not any(pure is not None and pure.memoize for pure in pures):
+            return
+        if not all(pure is not None and pure.verified for pure in pures):
+            return
+        if any(tc.is_method() for tc in testcases):
+            self._logger.warning("Not memoising the method {0}".format(
+                    func.__name__))
+            return
+        
+        listener = None
+        if self._metrics:
+            listener = functools.partial(metrics.record_cache, self._name,
+                                         func.__name__)
+        pure = pures[0]
+        self._caches[func] = memoize.MemoCache(pure.maxsize, pure.ttl,
+                                               listener)
+    
+    def get_caches(self):
+        """
+        Returns a dict mapping the names of memoised functions to their
+        :class:`~dectest.memoize.MemoCache`, which counts the hits and misses.
+        """
+        return dict((func.__name__, cache) for func, cache in
+                    self._caches.items())
+    
+    def run_case(self, name):
+        """
+        Runs the test case named ``name``, and returns ``True`` if it passed.
+        """
+        return self._run_case(self._testcases[name])
+    
+    def _run_case(self, tc, profiler=None):
+        """
+        Runs a single test case, recording metrics for it if they are enabled.
+        Returns ``True`` if the test case passed.
+        """
+        if not self._metrics:
+            return tc.test(profiler)
+        
+        start = perf.clock()
+        passed = tc.test(profiler)
+        metrics.record_test(self._name, tc.name, passed, perf.clock() - start)
+        return passed
     
     def _log_result(self, name, passed):
         """
@@ -175,7 +671,7 @@ class TestSuite():
             raise AttributeError("No test case {0}".format(name))
 
 
-class TestCase():
+class TestCase(object):
     """
     An invididual test case, containing all the information it needs to be
     tested. This class should not be created manually, as instances will be
@@ -196,26 +692,42 @@ class TestCase():
         print ts.a.__class__
         # dectest.suite.TestCase
     
+    As there may be a very large number of test cases, they are kept small.
+    The config, logger and activated side affect tests are shared between the
+    test cases of a suite in a :data:`CaseContext`, as are equal inputs, and
+    equal tag sets are shared between test cases.
     """
     
-    def __init__(self, config, logger, activated_sideaffects, method, name):
+    __slots__ = ("_context", "_raw_func", "_method", "_self", "_input",
+                 "_output", "_timeout", "_sideaffects", "_profiler", "name",
+                 "tags")
+    
+    def __init__(self, context, method, name, tags=()):
+        self._context = context
         self._raw_func = None
         self._method = method
         self._self = None
-        self._input = (), {}
+        self._input = NO_INPUT
         self._output = None
-        self._sideaffects = []
-        self._activated_sideaffects = activated_sideaffects
-        self.name = name
-        
-        self._config = config
-        self._logger = logger
+        self._timeout = None
+        self._sideaffects = ()
+        self._profiler = None
+        self.name = intern(name) if isinstance(name, str) else name
+        self.tags = intern_tags(tags)
+    
+    @property
+    def _config(self):
+        return self._context.config
+    
+    @property
+    def _logger(self):
+        return self._context.logger
     
     def input(self, *args, **kwargs):
         """
         Sets the input to the function in the test case. This is a decorator.
         """
-        self._input = args, kwargs
+        self._input = intern_input(args, kwargs, self._context.inputs)
         
         return self._blank_decorator
     
@@ -228,12 +740,53 @@ class TestCase():
         
         return self._blank_decorator
     
+    def timeout(self, seconds):
+        """
+        Sets the number of seconds that the function in the test case may run
+        for before the test case fails. Overrides the ``testing.timeout`` config
+        value. This is a decorator.
+        
+        Timeouts use ``SIGALRM``, so they are silently ignored when the test
+        case runs outside the main thread, as in :meth:`TestSuite.verify_all`.
+        """
+        self._timeout = seconds
+        
+        return self._blank_decorator
+    
+    def describe(self):
+        """
+        Returns a dict describing the test case, which can be stored without
+        keeping a reference to the tested function. The input and output are
+        given as their ``repr``, or as a placeholder if it can't be made.
+        """
+        return {
+            "name": self.name,
+            "function": getattr(self._raw_func, "__name__", None),
+            "module": getattr(self._raw_func, "__module__", None),
+            "tags": sorted(self.tags),
+            "input": safe_repr(self._input),
+            "out": safe_repr(self._output),
+            "sideaffects": [sat.name for sat in self._sideaffects],
+            }
+    
     def set_func(self, func):
         """
         Sets the function that is being tested.
         """
         self._raw_func = func
 
+    def get_function(self):
+        """
+        Returns the tested function, or ``None`` if it has not been set.
+        """
+        return self._raw_func
+    
+    def is_method(self):
+        """
+        Returns ``True`` if the tested function is a method.
+        """
+        return self._method
+    
     def needs_self(self):
         """
         Returns ``True`` if the test case needs a value for self, and does not
@@ -251,37 +804,108 @@ class TestCase():
             if sat.needs_instance:
                 sat.instance = self_
     
-    def test(self):
+    def test(self, profiler=None):
         """
         Runs the test case and returns ``True`` if the test case passed,
         otherwise ``False``.
+        
+        If a :class:`~dectest.profiling.CaseProfiler` is given, then the call
+        to the tested function is profiled with it.
         """
+        self._profiler = None
         self._pre_test()
         
-        out = self._run_test()
+        try:
+            out = self._run_test(profiler)
+        finally:
+            for test in self._sideaffects:
+                test.post_test()
         
         self._post_test()
         
         return out
     
+    def time(self, repeats, min_time=0.001):
+        """
+        Returns a list of ``repeats`` timings of the tested function, each the
+        mean duration of a call in a batch of calls that takes at least
+        ``min_time`` seconds, or an empty list if it raises an exception. The
+        global pre and post test functions are run around the timing, as they
+        are around :meth:`test`, but the side affect tests are not.
+        """
+        self._run_callback("pretest", "Pre-test")
+        try:
+            number = perf.calibrate(self.call, min_time)
+            return [perf.time_batch(self.call, number) / number
+                    for i in range(repeats)]
+        except Exception:
+            return []
+        finally:
+            self._run_callback("posttest", "Post-test")
+    
+    def call(self, func=None, args=None, kwargs=None):
+        """
+        Calls the tested function, or ``func`` if it is given, with the input
+        of the test case, and returns the output. Side affect tests can use
+        this to run the function again. If ``args`` or ``kwargs`` are given,
+        they are used instead of the input of the test case.
+        """
+        if args is None and kwargs is None:
+            args, kwargs = self._input
+        else:
+            args, kwargs = tuple(args or ()), kwargs or {}
+        
+        if self._method:
+            args = (self._self,) + args
+        
+        return (func or self._raw_func)(*args, **kwargs)
+    
+    def get_input(self):
+        """
+        Returns the input of the test case as an ``(args, kwargs)`` pair, as
+        set by :meth:`input`.
+        """
+        return self._input
+    
+    def get_output(self):
+        """
+        Returns the expected output of the test case, as set by :meth:`out`.
+        """
+        return self._output
+    
+    def get_sideaffect(self, sat_class):
+        """
+        Returns the first side affect test in use by the test case that is an
+        instance of ``sat_class``, or ``None`` if there is no such test.
+        """
+        for sat in self._sideaffects:
+            if isinstance(sat, sat_class):
+                return sat
+    
+    def get_profiler(self):
+        """
+        Returns the :class:`~dectest.profiling.CaseProfiler` that profiled the
+        last run of the test case, either from :meth:`test` or from the
+        :class:`~dectest.sideaffects.Profile` side affect test. Returns
+        ``None`` if the test case was not profiled.
+        """
+        sat = self.get_sideaffect(sideaffects.Profile)
+        if sat is not None and sat.profiler is not None:
+            return sat.profiler
+        return self._profiler
+    
     def _pre_test(self):
         """
         Runs any global pre test functions, along with the
         :meth:`~dectest.sideaffects.SideAffectTest.pre_test` method on every
         side affect test in use.
         """
-        pretest = self._config.get("testing", "pretest")
-        if pretest:
-           obj = self._config.get_python(pretest)
-           if callable(obj):
-               obj()
-           else:
-               self._logger.warning("Pre-test callback was not callable")
+        self._run_callback("pretest", "Pre-test")
         
         for test in self._sideaffects:
             test.pre_test()
     
-    def _run_test(self):
+    def _run_test(self, profiler=None):
         """
         Runs the actuall test. Returns ``True`` on pass, otherwise ``False``.
         """
@@ -290,35 +914,97 @@ class TestCase():
         if self._method:
             args = (self._self,) + args
         
-        output = self._raw_func(*args, **kwargs)
+        timeout = self._timeout
+        if timeout is None:
+            timeout = self._config.get("testing", "timeout")
         
         passed = True
+        if profiler is not None:
+            profiler.start()
+        try:
+            output = self._call(args, kwargs, timeout)
+        except TestTimeout:
+            self._logger.warning("Test case {0} timed out after {1} seconds"
+                                 .format(self.name, timeout))
+            passed = False
+        finally:
+            if profiler is not None:
+                profiler.stop()
+                self._profiler = profiler
+        
         passed = passed and output == self._output
         
+        # Every side affect test is run, as some need to clean up after the
+        # tested function even if the test case has already failed
         for test in self._sideaffects:
-            passed = passed and test.test()
+            passed = test.test() and passed
         
         return passed
     
+    def _call(self, args, kwargs, timeout):
+        """
+        Calls the tested function, raising :class:`TestTimeout` inside it if it
+        runs for longer than ``timeout`` seconds.
+        
+        The timeout is implemented with ``SIGALRM``, so it is only enforced
+        when running in the main thread of a platform that supports it, and is
+        silently ignored otherwise. If the program already has a ``SIGALRM``
+        timer running, it is restored afterwards with the time it had left; if
+        that timer is due before the timeout, the timeout is not enforced, so
+        that the program's own alarm is not taken over.
+        """
+        if not timeout or not hasattr(signal, "setitimer") or \
+                not isinstance(threading.current_thread(),
+                               threading._MainThread):
+            return self._raw_func(*args, **kwargs)
+        
+        pending, interval = signal.getitimer(signal.ITIMER_REAL)
+        if pending and pending <= timeout:
+            return self._raw_func(*args, **kwargs)
+        
+        def handler(signum, frame):
+            raise TestTimeout()
+        
+        old_handler = signal.signal(signal.SIGALRM, handler)
+        start = perf.clock()
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            return self._raw_func(*args, **kwargs)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, old_handler)
+            if pending:
+                left = max(pending - (perf.clock() - start), 1e-6)
+                signal.setitimer(signal.ITIMER_REAL, left, interval)
+    
     def _post_test(self):
         """
         Runs any global post test functions.
         """
-        posttest = self._config.get("testing", "posttest")
-        if posttest:
-           obj = self._config.get_python(posttest)
+        self._run_callback("posttest", "Post-test")
+    
+    def _run_callback(self, option, description):
+        """
+        Runs the global callback named by the ``testing`` config value
+        ``option``, if it is set.
+        """
+        name = self._config.get("testing", option)
+        if name:
+           obj = self._config.get_python(name)
            if callable(obj):
                obj()
            else:
-               self._logger.warning("Post-test callback was not callable")
+               self._logger.warning("{0} callback was not callable".format(
+                       description))
     
     def __getattr__(self, name):
         """
         Make the side affect tests accessable at their given names.
         """
-        if name in self._activated_sideaffects:
-            sat = self._activated_sideaffects[name](self._logger)
-            self._sideaffects.append(sat)
+        if not name.startswith("_") and name in self._context.sideaffects:
+            sat = self._context.sideaffects[name](self._logger)
+            sat.testcase = self
+            self._sideaffects += (sat,)
             return sat.decorator
         raise AttributeError()
     
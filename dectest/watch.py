@@ -0,0 +1,231 @@
+"""
+File watching for the command line runner. When started with ``--watch``, the
+runner runs the selected test cases once, and then waits for python files to
+change. Only the changed modules, and the test modules that depend on them, are
+reloaded, and only their test cases are re-run. Every other module stays
+imported in the watching process, so there is no start up cost between runs.
+
+Changes are detected with inotify if the optional ``pyinotify`` package is
+installed, otherwise the files are polled.
+"""
+
+import os
+import sys
+import time
+import types
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+from . import index as mindex
+from . import registry
+from . import runner
+
+class PollingWatcher():
+    """
+    Detects changed files by comparing their modification times and sizes
+    every ``interval`` seconds.
+    """
+
+    def __init__(self, paths, interval=0.5):
+        self.paths = paths
+        self.interval = interval
+        self.stamps = self._snapshot()
+
+    def _snapshot(self):
+        """
+        Returns a dict mapping each python file at the watched paths to it's
+        modification time and size.
+        """
+        stamps = {}
+        for filename in runner.find_files(self.paths):
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            stamps[os.path.abspath(filename)] = (st.st_mtime, st.st_size)
+        return stamps
+
+    def wait(self):
+        """
+        Blocks untill at least one file has changed or been created, and
+        returns the list of such files.
+        """
+        while True:
+            time.sleep(self.interval)
+            stamps = self._snapshot()
+            changed = [filename for filename, stamp in stamps.items()
+                       if self.stamps.get(filename) != stamp]
+            self.stamps = stamps
+            if changed:
+                return changed
+
+class InotifyWatcher():
+    """
+    Detects changed files with inotify. Events that arrive within ``settle``
+    seconds of each other are returned together, as editors often write a file
+    in several steps.
+    """
+
+    def __init__(self, paths, settle=0.05):
+        self.settle = settle
+        self.changed = set()
+        self.manager = pyinotify.WatchManager()
+        self.notifier = pyinotify.Notifier(self.manager, self._event)
+        mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO
+        for path in paths:
+            self.manager.add_watch(os.path.abspath(path), mask, rec=True,
+                                   auto_add=True)
+
+    def _event(self, event):
+        """
+        Records the file of an inotify event, if it is a python file.
+        """
+        if event.pathname.endswith(".py"):
+            self.changed.add(event.pathname)
+
+    def wait(self):
+        """
+        Blocks untill at least one file has changed or been created, and
+        returns the list of such files.
+        """
+        while not self.changed:
+            if self.notifier.check_events(None):
+                self.notifier.read_events()
+                self.notifier.process_events()
+            while self.notifier.check_events(self.settle * 1000):
+                self.notifier.read_events()
+                self.notifier.process_events()
+        changed = list(self.changed)
+        self.changed.clear()
+        return changed
+
+def make_watcher(paths, interval=0.5):
+    """
+    Returns an :class:`InotifyWatcher` if ``pyinotify`` is availible,
+    otherwise a :class:`PollingWatcher`.
+    """
+    if pyinotify is not None:
+        return InotifyWatcher(paths)
+    return PollingWatcher(paths, interval)
+
+def module_dependencies(module):
+    """
+    Returns the set of names of the modules that ``module`` uses, judging by
+    the modules, and the functions and classes from other modules, in it's
+    global namespace.
+    """
+    names = set()
+    for value in vars(module).values():
+        if isinstance(value, types.ModuleType):
+            names.add(value.__name__)
+        else:
+            name = getattr(value, "__module__", None)
+            if isinstance(name, str):
+                names.add(name)
+    names.discard(module.__name__)
+    return names
+
+class Dependents():
+    """
+    Records which test modules depend on which other modules, so that the test
+    cases of a test module can be re-run when a module it uses changes.
+    """
+
+    def __init__(self):
+        self.dependents = {}
+
+    def record(self, module):
+        """
+        Records the dependencies of the test module ``module``.
+        """
+        for name in module_dependencies(module):
+            self.dependents.setdefault(name, set()).add(module.__name__)
+
+    def get(self, name):
+        """
+        Returns the set of names of the test modules that depend on the module
+        named ``name``.
+        """
+        return self.dependents.get(name, set())
+
+def reload_module(name):
+    """
+    Reloads the module named ``name``, removing the test suites it defined from
+    the global registry first, and returns the reloaded module.
+    """
+    module = sys.modules[name]
+    for suite in runner.find_suites(module):
+        suite.unregister()
+    return reload(module)
+
+def refresh(changed, dependents):
+    """
+    Imports or reloads the files in ``changed``, along with the test modules
+    that depend on them, and returns a list in the format returned by
+    :func:`~dectest.runner.collect` of the test modules that were reloaded.
+    """
+    names = []
+    files = {}
+    for filename in changed:
+        if not os.path.exists(filename):
+            continue
+        directory, name = runner.module_name(filename)
+        if name in sys.modules or runner.might_register(filename):
+            names.append(name)
+            files[name] = filename
+    for name in list(names):
+        for dependent in sorted(dependents.get(name)):
+            if dependent not in names:
+                names.append(dependent)
+
+    collected = []
+    for name in names:
+        try:
+            if name in sys.modules:
+                module = reload_module(name)
+            else:
+                module = runner.import_file(files[name])
+        except Exception as e:
+            sys.stderr.write("Could not reload {0}: {1}\n".format(name, e))
+            continue
+
+        suites = runner.find_suites(module)
+        if suites:
+            dependents.record(module)
+            filename = files.get(name) or module.__file__
+            if filename.endswith((".pyc", ".pyo")):
+                filename = filename[:-1]
+            collected.append((filename, mindex.make_entry(
+                        filename, name, suites)))
+    return collected
+
+def watch(args):
+    """
+    Runs the selected test cases, then re-runs the affected test cases every
+    time a file changes, untill interrupted. ``args`` are the parsed command
+    line arguments of the runner.
+    """
+    dependents = Dependents()
+    collected = runner.collect(args.paths, None, args.threads)
+    for filename, entry in collected:
+        dependents.record(sys.modules[entry["module"]])
+
+    watcher = make_watcher(args.paths, args.poll_interval)
+    try:
+        while True:
+            try:
+                plan = runner.make_plan(collected, args.patterns, args.query)
+            except registry.QueryError as e:
+                sys.stderr.write(str(e) + "\n")
+                return 2
+            runner.run_plan(plan, args.maxfail, args.profile)
+
+            print "Watching for changes..."
+            collected = []
+            while not collected:
+                collected = refresh(watcher.wait(), dependents)
+    except KeyboardInterrupt:
+        return 0
@@ -0,0 +1,76 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from dectest import benchmarks
+
+def result(value):
+    return {"value": value}
+
+class RegressionsTest(unittest.TestCase):
+
+    def test_lower_is_better(self):
+        baseline = {"register": result(10.0)}
+        self.assertEqual(benchmarks.regressions(
+                {"register": result(10.9)}, baseline, 0.1), [])
+        self.assertEqual(benchmarks.regressions(
+                {"register": result(11.5)}, baseline, 0.1),
+                         [("register", 11.5, 10.0)])
+        self.assertEqual(benchmarks.regressions(
+                {"register": result(5.0)}, baseline, 0.1), [])
+
+    def test_higher_is_better(self):
+        baseline = {"test_1k": result(1000.0)}
+        self.assertEqual(benchmarks.regressions(
+                {"test_1k": result(950.0)}, baseline, 0.1), [])
+        self.assertEqual(benchmarks.regressions(
+                {"test_1k": result(850.0)}, baseline, 0.1),
+                         [("test_1k", 850.0, 1000.0)])
+        self.assertEqual(benchmarks.regressions(
+                {"test_1k": result(850.0)}, baseline, 0.2), [])
+
+    def test_benchmarks_missing_from_baseline(self):
+        self.assertEqual(benchmarks.regressions(
+                {"register": result(100.0)}, {}, 0.1), [])
+
+class MainTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.baseline = os.path.join(self.directory, "baseline.json")
+        self.stdout, self.stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+
+    def tearDown(self):
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+        shutil.rmtree(self.directory)
+
+    def save_baseline(self, results):
+        with open(self.baseline, "w") as f:
+            json.dump(results, f)
+
+    def test_compares_with_baseline(self):
+        self.assertEqual(benchmarks.main(["config_get", "--json"]), 0)
+        results = json.loads(sys.stdout.getvalue())
+        self.assertEqual(results["config_get"]["better"], "lower")
+
+        self.save_baseline(results)
+        self.assertEqual(benchmarks.main(["config_get", "--baseline",
+                                          self.baseline, "--tolerance",
+                                          "10"]), 0)
+
+        results["config_get"]["value"] /= 100.0
+        self.save_baseline(results)
+        self.assertEqual(benchmarks.main(["config_get", "--baseline",
+                                          self.baseline]), 1)
+        self.assertIn("config_get regressed", sys.stderr.getvalue())
+
+    def test_unknown_benchmark(self):
+        self.assertEqual(benchmarks.main(["nonexistent"]), 2)
+
+if __name__ == "__main__":
+    unittest.main()
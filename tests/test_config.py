@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from dectest import (EnvConfig, IniFileConfig, LayeredConfig,
+                     PythonFileConfig)
+
+class ConfigFileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text, age=0):
+        """
+        Writes ``text`` to the file ``name``, moving it's modification time
+        ``age`` seconds on so that the change is seen.
+        """
+        filename = os.path.join(self.directory, name)
+        with open(filename, "w") as f:
+            f.write(text)
+        stamp = os.stat(filename).st_mtime + age
+        os.utime(filename, (stamp, stamp))
+        return filename
+
+class LayeredConfigTest(ConfigFileTestCase):
+
+    def test_missing_file_does_not_hide_lower_layers(self):
+        config = LayeredConfig(
+            IniFileConfig("/nonexistent/dectest.ini"),
+            EnvConfig({"DECTEST_TESTING_TIMEOUT": "3"}))
+        self.assertEqual(config.get("testing", "timeout"), 3.0)
+        self.assertEqual(config.get("testing", "testasrun"), True)
+
+    def test_earlier_configs_take_precedence(self):
+        filename = self.write("dectest.ini", "[testing]\n"
+                              "timeout = 5\nmaxfail = 2\n")
+        config = LayeredConfig(
+            EnvConfig({"DECTEST_TESTING_TIMEOUT": "3"}),
+            IniFileConfig(filename))
+        self.assertEqual(config.get("testing", "timeout"), 3.0)
+        self.assertEqual(config.get("testing", "maxfail"), 2)
+        self.assertEqual(config.get("profiling", "limit"), 20)
+
+    def test_sees_reloaded_files(self):
+        filename = self.write("dectest.ini", "[testing]\nmaxfail = 2\n")
+        ini = IniFileConfig(filename)
+        config = LayeredConfig(EnvConfig({}), ini)
+        self.assertEqual(config.get("testing", "maxfail"), 2)
+        self.write("dectest.ini", "[testing]\nmaxfail = 7\n", age=10)
+        self.assertTrue(ini.refresh())
+        self.assertEqual(config.get("testing", "maxfail"), 7)
+
+class EnvConfigTest(unittest.TestCase):
+
+    def test_parses_names_and_types(self):
+        config = EnvConfig({
+                "DECTEST_TESTING_TESTASRUN": "no",
+                "DECTEST_DISTRIBUTED_BATCHSIZE": "8",
+                "DECTEST_PROFILING_STATSDIR": "/tmp/stats",
+                "DECTEST_NOSECTION": "1",
+                "HOME": "/root",
+                })
+        self.assertEqual(config.get_bool("testing", "testasrun"), False)
+        self.assertEqual(config.get("distributed", "batchsize"), 8)
+        self.assertEqual(config.get("profiling", "statsdir"), "/tmp/stats")
+        self.assertEqual(sorted(config.store),
+                         ["distributed", "profiling", "testing"])
+
+    def test_reload(self):
+        environ = {}
+        config = EnvConfig(environ)
+        environ["DECTEST_TESTING_MAXFAIL"] = "4"
+        self.assertEqual(config.get("testing", "maxfail"), None)
+        config.reload()
+        self.assertEqual(config.get("testing", "maxfail"), 4)
+
+class PythonFileConfigTest(ConfigFileTestCase):
+
+    def test_only_reloads_changed_files(self):
+        filename = self.write("config.py", "class testing:\n    maxfail = 1\n")
+        config = PythonFileConfig(filename)
+        store = config.store
+        self.assertFalse(config.refresh())
+        self.assertIs(config.store, store)
+
+        self.write("config.py", "class testing:\n    maxfail = 2\n", age=10)
+        self.assertTrue(config.refresh())
+        self.assertIsNot(config.store, store)
+        self.assertEqual(config.get("testing", "maxfail"), 2)
+
+    def test_check_interval(self):
+        filename = self.write("config.py", "class testing:\n    maxfail = 1\n")
+        config = PythonFileConfig(filename, check_interval=0)
+        self.write("config.py", "class testing:\n    maxfail = 3\n", age=10)
+        self.assertEqual(config.get("testing", "maxfail"), 3)
+
+    def test_keeps_old_store_when_reload_fails(self):
+        filename = self.write("config.py", "class testing:\n    maxfail = 1\n")
+        config = PythonFileConfig(filename)
+        store = config.store
+
+        self.write("config.py", "class testing:\n    maxfail = (\n", age=10)
+        self.assertTrue(config.refresh())
+        self.assertIs(config.store, store)
+        self.assertEqual(config.get("testing", "maxfail"), 1)
+        # The broken file is not parsed again untill it changes
+        self.assertFalse(config.refresh())
+
+        self.write("config.py", "class testing:\n    maxfail = 5\n", age=20)
+        self.assertTrue(config.refresh())
+        self.assertEqual(config.get("testing", "maxfail"), 5)
+
+if __name__ == "__main__":
+    unittest.main()
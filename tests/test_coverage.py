@@ -0,0 +1,109 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from dectest import coverage
+
+def branchy(x):
+    if x > 0:
+        return "positive"
+    return "other"
+
+FILENAME = branchy.__code__.co_filename
+FIRST = branchy.__code__.co_firstlineno
+
+class BitmapTest(unittest.TestCase):
+
+    def test_add_and_contains(self):
+        bitmap = coverage.Bitmap()
+        for line in (1, 7, 8, 300):
+            bitmap.add(line)
+        bitmap.add(8)
+        self.assertEqual(list(bitmap), [1, 7, 8, 300])
+        self.assertEqual(len(bitmap), 4)
+        self.assertIn(300, bitmap)
+        self.assertNotIn(9, bitmap)
+        self.assertNotIn(10000, bitmap)
+
+    def test_update(self):
+        first, second = coverage.Bitmap(), coverage.Bitmap()
+        first.add(3)
+        second.add(3)
+        second.add(100)
+        first.update(second)
+        self.assertEqual(list(first), [3, 100])
+
+class CoverageCollectorTest(unittest.TestCase):
+
+    def collect(self, *inputs):
+        collector = coverage.CoverageCollector([FILENAME])
+        collector.start()
+        try:
+            for x in inputs:
+                branchy(x)
+            os.path.join("a", "b")
+        finally:
+            collector.stop()
+        return collector.bitmaps
+
+    def test_records_executed_lines(self):
+        bitmaps = self.collect(1)
+        self.assertEqual(list(bitmaps), [FILENAME])
+        self.assertEqual(list(bitmaps[FILENAME]), [FIRST + 1, FIRST + 2])
+        self.assertEqual(list(self.collect(-1)[FILENAME]),
+                         [FIRST + 1, FIRST + 3])
+
+    def test_restores_the_previous_trace_function(self):
+        def trace(frame, event, arg):
+            return None
+        sys.settrace(trace)
+        try:
+            self.collect(1)
+            self.assertIs(sys.gettrace(), trace)
+        finally:
+            sys.settrace(None)
+
+    def test_each_start_begins_empty(self):
+        collector = coverage.CoverageCollector([FILENAME])
+        collector.start()
+        branchy(1)
+        collector.stop()
+        collector.start()
+        collector.stop()
+        self.assertEqual(len(collector.bitmaps[FILENAME]), 0)
+
+class CoverageReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "module.py")
+        with open(self.filename, "w") as f:
+            f.write("a = 1\n\ndef f():\n    return 2\n\nb = 3\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_executable_lines(self):
+        self.assertEqual(coverage.executable_lines(self.filename),
+                         set([1, 3, 4, 6]))
+        self.assertEqual(coverage.executable_lines("/nonexistent.py"), set())
+
+    def test_merged_summary(self):
+        report = coverage.CoverageReport()
+        for name, lines in (("a", [1]), ("b", [1, 3])):
+            bitmap = coverage.Bitmap()
+            for line in lines:
+                bitmap.add(line)
+            report.add(name, {self.filename: bitmap})
+        self.assertEqual(list(report.merged()[self.filename]), [1, 3])
+
+        stream = StringIO()
+        report.print_summary(stream)
+        row = stream.getvalue().splitlines()[1].split()
+        self.assertEqual(row[1:], ["4", "2", "50%", "4,", "6"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import logging
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+from dectest import distributed
+
+LOGGER = logging.getLogger("test_distributed")
+LOGGER.addHandler(logging.NullHandler())
+LOGGER.propagate = False
+
+CASES = """
+import socket
+import threading
+import time
+
+from dectest import DictConfig, TestSuite
+
+ts = TestSuite("cluster", DictConfig({'testing': {'testasrun': False}}))
+
+# (case name, worker thread name) for every run of a test case
+calls = []
+# The handler serving each worker thread, so a test case can kill it's worker
+handlers = {}
+# Test cases that sleep, and how many more times each killer kills a worker
+slow = set()
+killers = {}
+
+def run(name):
+    calls.append((name, threading.current_thread().name))
+    if name in slow:
+        time.sleep(0.2)
+    if killers.get(name):
+        killers[name] -= 1
+        handler = handlers[threading.current_thread().ident]
+        handler.connection.shutdown(socket.SHUT_RDWR)
+    return True
+
+def make_case(name):
+    def case():
+        return run(name)
+    case.__name__ = "case_" + name
+    ts.register(name)(getattr(ts, name).out(True)(case))
+
+for i in range(8):
+    make_case(str(i))
+"""
+
+class WorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.marker = os.path.join(self.directory, "imported")
+        self.evil = os.path.join(self.directory, "evil.py")
+        with open(self.evil, "w") as f:
+            f.write("open({0!r}, 'w').close()\n".format(self.marker))
+        self.worker = distributed.Worker("localhost:0", [])
+
+    def tearDown(self):
+        self.worker.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_refuses_files_not_loaded_at_startup(self):
+        self.assertFalse(self.worker.run_case(self.evil, "suite", "case"))
+        self.assertFalse(os.path.exists(self.marker))
+
+class CoordinatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.realpath(
+            os.path.join(self.directory, "cluster_cases.py"))
+        with open(self.filename, "w") as f:
+            f.write(CASES)
+        self.workers = []
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.shutdown()
+        sys.modules.pop("cluster_cases", None)
+        if self.directory in sys.path:
+            sys.path.remove(self.directory)
+        shutil.rmtree(self.directory)
+
+    def start_workers(self, count):
+        """
+        Starts ``count`` workers on localhost, and returns their addresses.
+        """
+        addresses = []
+        for i in range(count):
+            worker = distributed.Worker("localhost:0", [self.filename])
+            self.workers.append(worker)
+            worker.server.RequestHandlerClass = self.make_handler()
+            worker.server.handle_error = lambda request, address: None
+            thread = threading.Thread(target=worker.serve_forever,
+                                      name="worker-{0}".format(i))
+            thread.daemon = True
+            thread.start()
+            addresses.append("localhost:{0}".format(
+                    worker.server.server_address[1]))
+        self.module = sys.modules["cluster_cases"]
+        return addresses
+
+    def make_handler(self):
+        test = self
+
+        class Handler(distributed.WorkerHandler):
+            def handle(self):
+                test.module.handlers[threading.current_thread().ident] = self
+                distributed.WorkerHandler.handle(self)
+        return Handler
+
+    def cases(self):
+        return [(self.filename, "cluster", str(i)) for i in range(8)]
+
+    def ran(self, name):
+        return [thread for case, thread in self.module.calls if case == name]
+
+    def test_runs_every_case_once(self):
+        coordinator = distributed.Coordinator(self.start_workers(2),
+                                              logger=LOGGER)
+        results = coordinator.run(self.cases())
+        self.assertEqual(results, dict((case, True) for case in self.cases()))
+        self.assertEqual(sorted(case for case, thread in self.module.calls),
+                         [str(i) for i in range(8)])
+        self.assertEqual(set(thread for case, thread in self.module.calls),
+                         set(["worker-0", "worker-1"]))
+
+    def test_idle_worker_steals(self):
+        addresses = self.start_workers(2)
+        # The cases dealt to the first worker are slow
+        self.module.slow.update(str(i) for i in range(0, 8, 2))
+        coordinator = distributed.Coordinator(addresses, batch_size=1,
+                                              logger=LOGGER)
+        results = coordinator.run(self.cases())
+        self.assertTrue(all(results.values()))
+        self.assertEqual(len(self.module.calls), 8)
+        stolen = [str(i) for i in range(0, 8, 2)
+                  if self.ran(str(i)) == ["worker-1"]]
+        self.assertTrue(stolen)
+
+    def test_dead_workers_cases_are_run_elsewhere(self):
+        addresses = self.start_workers(2)
+        self.module.killers["0"] = 1
+        coordinator = distributed.Coordinator(addresses, batch_size=2,
+                                              logger=LOGGER)
+        results = coordinator.run(self.cases())
+        self.assertEqual(results, dict((case, True) for case in self.cases()))
+        self.assertEqual(self.ran("0"), ["worker-0", "worker-1"])
+        for i in range(1, 8):
+            self.assertTrue(self.ran(str(i)))
+
+    def test_attempts_are_respected(self):
+        addresses = self.start_workers(3)
+        self.module.killers["0"] = 3
+        coordinator = distributed.Coordinator(addresses, batch_size=1,
+                                              attempts=2, logger=LOGGER)
+        results = coordinator.run(self.cases())
+        self.assertFalse(results[(self.filename, "cluster", "0")])
+        self.assertEqual(len(self.ran("0")), 2)
+        for i in range(1, 8):
+            self.assertTrue(results[(self.filename, "cluster", str(i))])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from dectest.memoize import MemoCache, is_immutable
+
+def half(x):
+    return x / 2
+
+def rng(n):
+    return list(range(n))
+
+class MemoCacheTest(unittest.TestCase):
+
+    def test_equal_arguments_of_different_types(self):
+        cache = MemoCache()
+        self.assertEqual(cache.call(half, (1,), {}), 0)
+        self.assertEqual(cache.call(half, (1.0,), {}), 0.5)
+        self.assertEqual(cache.call(half, (True,), {}), 0)
+        self.assertEqual(cache.call(half, (1.0,), {}), 0.5)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_keyword_arguments_of_different_types(self):
+        cache = MemoCache()
+        self.assertEqual(cache.call(half, (), {"x": 1}), 0)
+        self.assertEqual(cache.call(half, (), {"x": 1.0}), 0.5)
+
+    def test_lru_eviction(self):
+        cache = MemoCache(maxsize=2)
+        for x in (1, 2, 1, 3, 1):
+            cache.call(half, (x,), {})
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        self.assertEqual(len(cache), 2)
+
+    def test_changing_a_result_does_not_change_the_cache(self):
+        cache = MemoCache()
+        first = cache.call(rng, (3,), {})
+        first.append(99)
+        second = cache.call(rng, (3,), {})
+        self.assertEqual(second, [0, 1, 2])
+        second.append(99)
+        self.assertEqual(cache.call(rng, (3,), {}), [0, 1, 2])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_immutable_results_are_shared(self):
+        cache = MemoCache()
+        value = cache.call(lambda: (1, "a", frozenset([2.0])), (), {})
+        self.assertIs(cache.call(None, (), {}), value)
+        self.assertTrue(is_immutable(value))
+        self.assertFalse(is_immutable((1, [2])))
+
+if __name__ == "__main__":
+    unittest.main()
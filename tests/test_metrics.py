@@ -0,0 +1,106 @@
+import socket
+import unittest
+
+from dectest import DictConfig, TestSuite, metrics
+
+class FormatPrometheusTest(unittest.TestCase):
+
+    def test_counters_and_histograms(self):
+        registry = metrics.MetricsRegistry()
+        registry.counter("runs_total", "Runs.", ("suite",)).inc(("a\"b",), 2)
+        histogram = registry.histogram("duration_seconds", "Durations.",
+                                       ("suite",))
+        histogram.observe(("a",), 0.5)
+        histogram.observe(("a",), 100.0)
+        lines = metrics.format_prometheus(registry).splitlines()
+
+        self.assertIn("# TYPE runs_total counter", lines)
+        self.assertIn('runs_total{suite="a\\"b"} 2', lines)
+        self.assertIn("# TYPE duration_seconds histogram", lines)
+        self.assertIn('duration_seconds_bucket{suite="a",le="+Inf"} 2', lines)
+        self.assertIn('duration_seconds_sum{suite="a"} 100.5', lines)
+        self.assertIn('duration_seconds_count{suite="a"} 2', lines)
+        buckets = [int(line.rsplit(" ", 1)[1]) for line in lines
+                   if line.startswith("duration_seconds_bucket")]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertIn(1, buckets)
+
+class StatsdEmitterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receiver.bind(("127.0.0.1", 0))
+        self.receiver.settimeout(0.05)
+        self.registry = metrics.MetricsRegistry()
+        self.counter = self.registry.counter("runs_total", "Runs.",
+                                             ("suite",))
+
+    def tearDown(self):
+        self.receiver.close()
+
+    def make_emitter(self, max_packet=1432, flush_interval=None):
+        emitter = metrics.StatsdEmitter(
+            "127.0.0.1", self.receiver.getsockname()[1],
+            max_packet=max_packet, flush_interval=flush_interval)
+        self.addCleanup(emitter.close)
+        self.registry.add_listener(emitter)
+        return emitter
+
+    def packets(self):
+        packets = []
+        while True:
+            try:
+                packets.append(self.receiver.recv(65536))
+            except socket.timeout:
+                return packets
+
+    def test_batches_untill_flushed(self):
+        self.make_emitter()
+        self.counter.inc(("a",))
+        self.counter.inc(("b",), 3)
+        self.assertEqual(self.packets(), [])
+        self.registry.flush()
+        self.assertEqual(self.packets(), ["dectest.runs_total.a:1|c\n"
+                                          "dectest.runs_total.b:3|c"])
+
+    def test_full_packets_are_sent(self):
+        # Each line is 25 bytes, so two fit in a packet
+        self.make_emitter(max_packet=60)
+        for i in range(5):
+            self.counter.inc(("a",))
+        self.assertEqual(len(self.packets()), 2)
+        self.registry.flush()
+        self.assertEqual(self.packets(), ["dectest.runs_total.a:1|c"])
+
+    def test_flushes_on_an_interval(self):
+        self.make_emitter(flush_interval=0.01)
+        self.counter.inc(("a",))
+        self.receiver.settimeout(1)
+        self.assertEqual(self.receiver.recv(65536), "dectest.runs_total.a:1|c")
+
+class OverheadTest(unittest.TestCase):
+
+    def overhead_recorded(self, name, **options):
+        options['enabled'] = True
+        ts = TestSuite(name, DictConfig({'testing': {'testasrun': False},
+                                         'metrics': options}))
+
+        @ts.register("a")
+        @ts.a.out(1)
+        def one():
+            return 1
+
+        one()
+        ts.unregister()
+        histogram = metrics.METRICS.histogram(
+            "dectest_wrapper_overhead_seconds", "", ("suite",))
+        return (name,) in histogram.values
+
+    def test_off_by_default(self):
+        self.assertFalse(self.overhead_recorded("overhead_off"))
+
+    def test_opt_in(self):
+        self.assertTrue(self.overhead_recorded("overhead_on", overhead=True))
+
+if __name__ == "__main__":
+    unittest.main()
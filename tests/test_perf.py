@@ -0,0 +1,28 @@
+import os
+import unittest
+
+from dectest import perf
+
+def boom():
+    raise ValueError("boom")
+
+def die():
+    os._exit(3)
+
+class RunProcessesTest(unittest.TestCase):
+
+    def test_exception_in_child(self):
+        self.assertRaises(perf.LoadError, perf.run_processes, boom, 1, 0.2)
+
+    def test_child_dies(self):
+        self.assertRaises(perf.LoadError, perf.run_processes, die, 2, 0.2)
+
+    def test_exception_in_thread(self):
+        self.assertRaises(perf.LoadError, perf.run_threads, boom, 2, 0.2)
+
+    def test_counts_calls(self):
+        result = perf.run_processes(lambda: None, 2, 0.1)
+        self.assertTrue(result.calls > 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import sys
+import threading
+import unittest
+from StringIO import StringIO
+
+from dectest import DictConfig, TestSuite
+from dectest.sideaffects import Profile
+
+class ProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        sys.setprofile(None)
+
+    def make_suite(self):
+        ts = TestSuite("profiled", DictConfig({'testing': {
+                        'testasrun': False,
+                        'sideaffects': ['dectest.sideaffects.Profile']}}))
+
+        @ts.register("ok")
+        @ts.ok.out(1)
+        @ts.ok.profile()
+        def one():
+            return 1
+
+        @ts.register("boom")
+        @ts.boom.profile()
+        def boom():
+            raise ValueError("boom")
+        return ts
+
+    def samplers(self):
+        return [thread for thread in threading.enumerate()
+                if type(thread).__name__ == "StackSampler"]
+
+    def test_stops_after_a_pass(self):
+        ts = self.make_suite()
+        self.assertTrue(ts.run_case("ok"))
+        profiler = ts.ok.get_sideaffect(Profile).profiler
+        self.assertIsNotNone(profiler.stats)
+        self.assertIsNone(sys.getprofile())
+        self.assertEqual(self.samplers(), [])
+
+    def test_stops_when_the_function_raises(self):
+        ts = self.make_suite()
+        self.assertRaises(ValueError, ts.run_case, "boom")
+        profiler = ts.boom.get_sideaffect(Profile).profiler
+        self.assertIsNotNone(profiler.stats)
+        self.assertIsNone(sys.getprofile())
+        self.assertEqual(self.samplers(), [])
+
+class GetProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def test_only_profilers_from_the_last_run(self):
+        ts = TestSuite("plain", DictConfig({'testing': {'testasrun': False}}))
+
+        @ts.register("a")
+        @ts.a.out(1)
+        def one():
+            return 1
+
+        ts.test(profile=True)
+        self.assertIsNotNone(ts.a.get_profiler())
+        ts.test(profile=False)
+        self.assertIsNone(ts.a.get_profiler())
+        self.assertNotIn("Profile of", sys.stdout.getvalue().split(
+                "All tests passed")[-1])
+
+if __name__ == "__main__":
+    unittest.main()
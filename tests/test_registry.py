@@ -0,0 +1,52 @@
+import gc
+import unittest
+import weakref
+
+from dectest import DictConfig, TestSuite
+from dectest.registry import REGISTRY, InvertedIndex
+
+class InvertedIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = InvertedIndex()
+        for i in range(100):
+            keys = ["even" if i % 2 == 0 else "odd"]
+            if i % 10 == 0:
+                keys.append("tens")
+            if i < 5:
+                keys.append("small")
+            self.index.add(i, keys)
+
+    def test_not_larger_than_result(self):
+        self.assertEqual(self.index.select("tens and not even"), set())
+        self.assertEqual(self.index.select("small and not odd"),
+                         set([0, 2, 4]))
+
+    def test_not_smaller_than_result(self):
+        self.assertEqual(self.index.select("even and not tens"),
+                         set(range(2, 100, 2)) - set(range(0, 100, 10)))
+
+    def test_not_alone(self):
+        self.assertEqual(self.index.select("not odd"), set(range(0, 100, 2)))
+
+class RegistryTest(unittest.TestCase):
+
+    def test_unregistered_suites_are_collected(self):
+        ts = TestSuite("unregister", DictConfig({'testing':
+                                                   {'testasrun': False}}))
+
+        @ts.register("a", tags=["unregister_tag"])
+        @ts.a.out(1)
+        def one():
+            return 1
+
+        self.assertIn(ts, REGISTRY.select("unregister_tag"))
+        ref = weakref.ref(ts)
+        ts.unregister()
+        del ts, one
+        gc.collect()
+        self.assertIsNone(ref())
+        self.assertEqual(REGISTRY.select("unregister_tag"), {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from dectest import index, runner
+
+MODULE = """
+from dectest import DictConfig, TestSuite
+
+class Unprintable(object):
+    def __repr__(self):
+        raise RuntimeError("no repr")
+
+ts = TestSuite("unprintable", DictConfig({'testing': {'testasrun': False}}))
+
+@ts.register("a")
+@ts.a.input(Unprintable())
+@ts.a.out(1)
+def connect(conn):
+    return 1
+"""
+
+class CollectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "unprintable_cases.py")
+        with open(self.filename, "w") as f:
+            f.write(MODULE)
+
+    def tearDown(self):
+        sys.modules.pop("unprintable_cases", None)
+        if self.directory in sys.path:
+            sys.path.remove(self.directory)
+        shutil.rmtree(self.directory)
+
+    def check(self, collected):
+        self.assertEqual(len(collected), 1)
+        case = collected[0][1]["suites"][0]["cases"][0]
+        self.assertEqual(case["name"], "a")
+        self.assertEqual(case["input"], "<unprintable tuple>")
+        self.assertEqual(case["out"], "1")
+
+    def test_unprintable_input(self):
+        self.check(runner.collect([self.directory]))
+
+    def test_unprintable_input_with_index(self):
+        collection = index.CollectionIndex(
+            os.path.join(self.directory, ".dectest_index"))
+        self.check(runner.collect([self.directory], collection))
+        collection.save()
+
+CASES = """
+from dectest import DictConfig, TestSuite
+
+ts = TestSuite("parser", DictConfig({'testing': {'testasrun': False}}))
+
+@ts.register("split", tags=["fast"])
+@ts.split.input("a,b")
+@ts.split.out(["a", "b"])
+@ts.register("split_empty", tags=["fast", "edge"])
+@ts.split_empty.input("")
+@ts.split_empty.out([""])
+def split(text):
+    return text.split(",")
+
+@ts.register("join", tags=["slow"])
+@ts.join.input(["a", "b"])
+@ts.join.out("a,b")
+def join(parts):
+    return ",".join(parts)
+"""
+
+class DiscoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.package = os.path.join(self.directory, "runner_pkg")
+        os.makedirs(os.path.join(self.package, ".hidden"))
+        self.marker = os.path.join(self.directory, "imported")
+        self.files = {
+            "__init__.py": "",
+            "cases.py": CASES,
+            "plain.py": "open({0!r}, 'w').close()\n".format(self.marker),
+            os.path.join(".hidden", "hidden.py"): CASES,
+            "notes.txt": "register(",
+            }
+        for name, text in self.files.items():
+            with open(os.path.join(self.package, name), "w") as f:
+                f.write(text)
+        self.stdout, self.stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+
+    def tearDown(self):
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+        for name in ("runner_pkg", "runner_pkg.cases"):
+            sys.modules.pop(name, None)
+        if self.directory in sys.path:
+            sys.path.remove(self.directory)
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.package, name)
+
+    def test_find_files_skips_hidden_and_other_files(self):
+        self.assertEqual(sorted(runner.find_files([self.directory])),
+                         [self.path("__init__.py"), self.path("cases.py"),
+                          self.path("plain.py")])
+
+    def test_scan(self):
+        files = runner.find_files([self.directory])
+        self.assertEqual(runner.scan(files, 2), [self.path("cases.py")])
+
+    def test_module_name(self):
+        self.assertEqual(runner.module_name(self.path("cases.py")),
+                         (self.directory, "runner_pkg.cases"))
+        self.assertEqual(runner.module_name(self.path("__init__.py")),
+                         (self.directory, "runner_pkg"))
+
+    def test_only_registering_modules_are_imported(self):
+        collected = runner.collect([self.directory])
+        self.assertEqual([filename for filename, entry in collected],
+                         [self.path("cases.py")])
+        self.assertFalse(os.path.exists(self.marker))
+
+    def test_plan_by_pattern_and_query(self):
+        collected = runner.collect([self.directory])
+        everything = runner.make_plan(collected, [])
+        self.assertEqual(everything, [(self.path("cases.py"), "parser",
+                                       set(["split", "split_empty", "join"]))])
+        by_pattern = runner.make_plan(collected, ["parser.split*"])
+        self.assertEqual(by_pattern[0][2], set(["split", "split_empty"]))
+        by_query = runner.make_plan(collected, ["split*"], "not edge")
+        self.assertEqual(by_query[0][2], set(["split"]))
+        self.assertEqual(runner.make_plan(collected, ["nothing"]), [])
+
+    def test_main(self):
+        self.assertEqual(runner.main([self.directory, "--no-index", "--list",
+                                      "-t", "fast"]), 0)
+        self.assertEqual(sys.stdout.getvalue().split(),
+                         ["parser.split", "parser.split_empty"])
+        self.assertEqual(runner.main([self.directory, "--no-index"]), 0)
+        self.assertEqual(runner.main([self.directory, "--no-index", "-t",
+                                      "fast and ("]), 2)
+
+if __name__ == "__main__":
+    unittest.main()
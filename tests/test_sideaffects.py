@@ -0,0 +1,31 @@
+import unittest
+
+from dectest import DictConfig, TestSuite, perf
+from dectest.sideaffects import ComparePerf
+
+def identity(x):
+    return x
+
+class ComparePerfTest(unittest.TestCase):
+
+    def test_same_function_is_not_faster(self):
+        ts = TestSuite("compare", DictConfig({'testing': {
+                        'testasrun': False,
+                        'sideaffects': ['dectest.sideaffects.ComparePerf']}}))
+
+        @ts.register("a")
+        @ts.a.input(1)
+        @ts.a.out(1)
+        @ts.a.compare_perf(identity, min_speedup=0.0)
+        def same(x):
+            return x
+
+        ts.run_case("a")
+        comparison = ts.a.get_sideaffect(ComparePerf).comparison
+        # Use a 99.9% interval, so that the test is rarely failed by noise
+        wide = perf.Comparison(comparison.ratios, z=3.29)
+        self.assertTrue(wide.low <= 1.0 <= wide.high,
+                        (wide.low, wide.high))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from dectest import DictConfig, TestSuite, strategies
+from dectest.sideaffects import Generate
+
+def small(args):
+    return args[0] < 10
+
+def small_sum(args):
+    return sum(args[0]) < 50
+
+class SearchTest(unittest.TestCase):
+
+    def test_shrinks_to_minimal_counterexample(self):
+        numbers = [strategies.integers(0, 1000)]
+        failure = strategies.search(small, numbers, 1000, seed=1)
+        self.assertFalse(small(failure))
+        self.assertEqual(strategies.minimize(small, numbers, failure), (10,))
+
+    def test_shrinks_lists(self):
+        lists = [strategies.lists(strategies.integers(0, 100))]
+        failure = strategies.search(small_sum, lists, 1000, seed=3)
+        self.assertEqual(strategies.minimize(small_sum, lists, failure),
+                         ([50],))
+
+    def test_seeded_search_is_reproducible(self):
+        lists = [strategies.lists(strategies.integers(0, 100))]
+        first = strategies.search(small_sum, lists, 1000, seed=3,
+                                  batch_size=10)
+        self.assertIsNotNone(first)
+        self.assertEqual(strategies.search(small_sum, lists, 1000, seed=3,
+                                           batch_size=10), first)
+        self.assertEqual(strategies.search(small_sum, lists, 1000, seed=3,
+                                           batch_size=10, processes=2), first)
+
+    def test_no_failure(self):
+        self.assertIsNone(strategies.search(lambda args: True,
+                                            [strategies.booleans()], 100))
+
+class GenerateTest(unittest.TestCase):
+
+    def make_suite(self, func, **options):
+        ts = TestSuite("generate", DictConfig({'testing': {
+                        'testasrun': False,
+                        'sideaffects': ['dectest.sideaffects.Generate']}}))
+        decorator = ts.register("a")
+        ts.a.input(1)
+        ts.a.out(2)
+        ts.a.generate(strategies.integers(0, 100), examples=200, seed=0,
+                      **options)
+        decorator(func)
+        return ts
+
+    def test_output_of_test_case_is_not_compared(self):
+        ts = self.make_suite(lambda x: x * 2)
+        self.assertTrue(ts.run_case("a"))
+
+    def test_fails_when_the_function_raises(self):
+        def half(x):
+            if x > 50:
+                raise ValueError(x)
+            return x * 2
+        ts = self.make_suite(half)
+        self.assertFalse(ts.run_case("a"))
+        self.assertEqual(ts.a.get_sideaffect(Generate).counterexample, (51,))
+
+    def test_property(self):
+        ts = self.make_suite(lambda x: x * 2,
+                             property=lambda args, out: out < 100)
+        self.assertFalse(ts.run_case("a"))
+        self.assertEqual(ts.a.get_sideaffect(Generate).counterexample, (50,))
+
+if __name__ == "__main__":
+    unittest.main()
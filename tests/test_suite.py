@@ -0,0 +1,203 @@
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import unittest
+from StringIO import StringIO
+
+from dectest import DictConfig, TestSuite, history, suite
+
+class InternInputTest(unittest.TestCase):
+
+    def test_equal_inputs_of_different_types(self):
+        ts = TestSuite("intern", DictConfig({'testing': {'testasrun': False}}))
+
+        @ts.register("a")
+        @ts.a.input(1)
+        @ts.a.out(0)
+        @ts.register("b")
+        @ts.b.input(1.0)
+        @ts.b.out(0.5)
+        def half(x):
+            return x / 2
+
+        self.assertEqual(ts.b.get_input(), ((1.0,), {}))
+        self.assertIs(type(ts.b.get_input()[0][0]), float)
+        self.assertTrue(ts.run_case("a"))
+        self.assertTrue(ts.run_case("b"))
+
+class CompactTest(unittest.TestCase):
+
+    def make_suite(self, name):
+        ts = TestSuite(name, DictConfig({'testing': {
+                        'testasrun': False,
+                        'sideaffects': [
+                            'dectest.sideaffects.GlobalStateChange']}}))
+
+        @ts.register("a", tags=["fast", "db"])
+        @ts.a.input(1, 2, key="x")
+        @ts.a.out(3)
+        @ts.a.globalstatechange({"CONSTANT": lambda a, b: a == b})
+        @ts.register("b", tags=["db", "fast"])
+        @ts.b.input(1, 2, key="x")
+        @ts.b.out(3)
+        @ts.register("c")
+        @ts.c.out(3)
+        def add(a=1, b=2, key=None):
+            return a + b
+        return ts
+
+    def test_no_instance_dicts(self):
+        ts = self.make_suite("compact")
+        self.assertFalse(hasattr(ts.a, "__dict__"))
+        self.assertFalse(hasattr(ts.a._sideaffects[0], "__dict__"))
+
+    def test_equal_inputs_and_tags_are_shared(self):
+        ts = self.make_suite("shared")
+        self.assertIs(ts.a.get_input(), ts.b.get_input())
+        self.assertIs(ts.a.tags, ts.b.tags)
+        self.assertIs(ts.c.get_input(), suite.NO_INPUT)
+
+    def test_inputs_are_not_shared_between_suites(self):
+        first = self.make_suite("first")
+        second = self.make_suite("second")
+        self.assertIsNot(first.a.get_input(), second.a.get_input())
+        self.assertIs(first.a.tags, second.a.tags)
+
+    def test_unhashable_inputs(self):
+        ts = TestSuite("unhashable", DictConfig({'testing':
+                                                   {'testasrun': False}}))
+
+        @ts.register("a")
+        @ts.a.input([1, 2])
+        @ts.a.out(3)
+        def total(values):
+            return sum(values)
+
+        self.assertEqual(ts.a.get_input(), (([1, 2],), {}))
+        self.assertTrue(ts.run_case("a"))
+
+class Unprintable(object):
+    def __repr__(self):
+        raise RuntimeError("no repr")
+
+class RegisterTest(unittest.TestCase):
+
+    def test_input_without_repr(self):
+        ts = TestSuite("norepr", DictConfig({'testing': {'testasrun': False}}))
+
+        @ts.register("a", tags=["db"])
+        @ts.a.input(Unprintable())
+        @ts.a.out(1)
+        def connect(conn):
+            return 1
+
+        self.assertEqual(ts.select("db and function:connect"), set(["a"]))
+        self.assertEqual(ts.select("module:" + __name__), set(["a"]))
+
+class TimeoutTest(unittest.TestCase):
+
+    def tearDown(self):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+    def make_suite(self, delay):
+        ts = TestSuite("timeout", DictConfig({'testing':
+                                                {'testasrun': False}}))
+
+        @ts.register("a")
+        @ts.a.out(None)
+        @ts.a.timeout(0.2)
+        def sleep():
+            time.sleep(delay)
+        return ts
+
+    def test_restores_the_programs_timer(self):
+        signal.setitimer(signal.ITIMER_REAL, 30)
+        self.assertTrue(self.make_suite(0.01).run_case("a"))
+        left = signal.getitimer(signal.ITIMER_REAL)[0]
+        self.assertTrue(29 < left <= 30)
+
+    def test_times_out(self):
+        self.assertFalse(self.make_suite(1).run_case("a"))
+        self.assertEqual(signal.getitimer(signal.ITIMER_REAL)[0], 0)
+
+class VerifyAllTest(unittest.TestCase):
+
+    def make_suite(self):
+        ts = TestSuite("verify", DictConfig({'testing': {'testasrun': False}}))
+
+        @ts.register("fast")
+        @ts.fast.out(1)
+        def fast():
+            return 1
+
+        @ts.register("slow")
+        @ts.slow.out(1)
+        def slow():
+            time.sleep(0.5)
+            return 1
+        return ts, fast, slow
+
+    def test_verifies_and_marks_tested(self):
+        ts, fast, slow = self.make_suite()
+        readiness = TestSuite.verify_all(workers=2, suites=[ts])
+        self.assertTrue(readiness.ready)
+        self.assertEqual(readiness.passed, ["verify.fast", "verify.slow"])
+        self.assertTrue(fast._original_function.tested)
+
+    def test_late_functions_are_not_marked_tested(self):
+        ts, fast, slow = self.make_suite()
+        readiness = TestSuite.verify_all(workers=2, deadline=0.1, suites=[ts])
+        self.assertFalse(readiness.ready)
+        self.assertEqual(readiness.timed_out, ["verify.slow"])
+        time.sleep(0.6)
+        self.assertFalse(slow._original_function.tested)
+
+    def test_needs_a_worker(self):
+        ts, fast, slow = self.make_suite()
+        self.assertRaises(ValueError, TestSuite.verify_all, workers=0,
+                          suites=[ts])
+
+class HistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "history")
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        shutil.rmtree(self.directory)
+
+    def make_suite(self, calls):
+        ts = TestSuite("history", DictConfig({
+                    'testing': {'testasrun': False},
+                    'history': {'file': self.filename, 'repeats': 3}}))
+
+        @ts.register("a")
+        @ts.a.out(1)
+        @ts.register("b")
+        @ts.b.out(1)
+        def one():
+            calls.append(None)
+            return 1
+        return ts
+
+    def test_timings_are_batched(self):
+        calls = []
+        self.make_suite(calls).test()
+        runs = history.History(self.filename).runs("history")
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(sorted(runs[0]["cases"]), ["a", "b"])
+        self.assertEqual(len(runs[0]["cases"]["a"]), 3)
+        self.assertTrue(len(calls) > 2 * 4)
+
+    def test_subset_runs_are_not_recorded(self):
+        self.make_suite([]).test(names=set(["a"]))
+        self.assertEqual(history.History(self.filename).runs("history"), [])
+
+if __name__ == "__main__":
+    unittest.main()
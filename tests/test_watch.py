@@ -0,0 +1,132 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from StringIO import StringIO
+
+from dectest import registry, watch
+
+LIB = """
+def value():
+    return {0}
+"""
+
+CASES = """
+from dectest import DictConfig, TestSuite
+from watch_lib import value
+
+ts = TestSuite("watched", DictConfig({'testing': {'testasrun': False}}))
+
+@ts.register("value")
+@ts.value.out(1)
+def check():
+    return value()
+"""
+
+class WatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.lib = os.path.join(self.directory, "watch_lib.py")
+        self.cases = os.path.join(self.directory, "watch_cases.py")
+        self.write(self.lib, LIB.format(1))
+        self.write(self.cases, CASES)
+        sys.path.insert(0, self.directory)
+        self.stderr = sys.stderr
+        sys.stderr = StringIO()
+
+    def tearDown(self):
+        sys.stderr = self.stderr
+        module = sys.modules.pop("watch_cases", None)
+        if module is not None:
+            module.ts.unregister()
+        sys.modules.pop("watch_lib", None)
+        sys.path.remove(self.directory)
+        shutil.rmtree(self.directory)
+
+    def write(self, filename, text, age=0):
+        with open(filename, "w") as f:
+            f.write(text)
+        # Python 2 only checks the modification time of a .pyc, in seconds
+        stamp = os.stat(filename).st_mtime + age
+        os.utime(filename, (stamp, stamp))
+
+    def suites(self):
+        return [suite for suite in registry.REGISTRY.suites
+                if suite.name == "watched"]
+
+    def test_dependencies(self):
+        import watch_cases
+        self.assertIn("watch_lib", watch.module_dependencies(watch_cases))
+        self.assertNotIn("watch_cases",
+                         watch.module_dependencies(watch_cases))
+        dependents = watch.Dependents()
+        dependents.record(watch_cases)
+        self.assertEqual(dependents.get("watch_lib"), set(["watch_cases"]))
+        self.assertEqual(dependents.get("os"), set())
+
+    def test_reload_module_replaces_suites(self):
+        import watch_cases
+        old = watch_cases.ts
+        module = watch.reload_module("watch_cases")
+        self.assertIsNot(module.ts, old)
+        self.assertEqual(self.suites(), [module.ts])
+
+    def test_refresh_reruns_dependents(self):
+        import watch_cases
+        dependents = watch.Dependents()
+        dependents.record(watch_cases)
+        self.assertTrue(watch_cases.ts.run_case("value"))
+
+        self.write(self.lib, LIB.format(2), age=10)
+        collected = watch.refresh([self.lib], dependents)
+        self.assertEqual([filename for filename, entry in collected],
+                         [self.cases])
+        self.assertEqual(collected[0][1]["module"], "watch_cases")
+        self.assertEqual(len(self.suites()), 1)
+        self.assertFalse(sys.modules["watch_cases"].ts.run_case("value"))
+
+    def test_refresh_skips_unrelated_files(self):
+        other = os.path.join(self.directory, "watch_other.py")
+        self.write(other, "x = 1\n")
+        self.assertEqual(watch.refresh([other], watch.Dependents()), [])
+        self.assertNotIn("watch_other", sys.modules)
+
+    def test_refresh_reports_broken_modules(self):
+        import watch_cases
+        self.write(self.cases, "this is not python\n", age=10)
+        self.assertEqual(watch.refresh([self.cases], watch.Dependents()), [])
+        self.assertIn("Could not reload watch_cases", sys.stderr.getvalue())
+
+class PollingWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "polled.py")
+        with open(self.filename, "w") as f:
+            f.write("x = 1\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_detects_changes(self):
+        watcher = watch.PollingWatcher([self.directory], interval=0.01)
+        created = os.path.join(self.directory, "created.py")
+
+        def change():
+            with open(self.filename, "a") as f:
+                f.write("y = 2\n")
+            open(created, "w").close()
+        timer = threading.Timer(0.05, change)
+        timer.start()
+        changed = watcher.wait()
+        timer.join()
+        if len(changed) < 2:
+            changed += watcher.wait()
+        self.assertEqual(sorted(changed), sorted([
+                    os.path.abspath(created), os.path.abspath(self.filename)]))
+
+if __name__ == "__main__":
+    unittest.main()